@@ -0,0 +1,98 @@
+import os
+import sqlite3
+import hashlib
+import threading
+import time
+
+ANSWER_CACHE_PATH = os.getenv("OA_ANSWER_CACHE_PATH", "embeddings/answer_cache.sqlite")
+
+# Hash of everything an answer depends on: the application's index version, the question, the model and the prompt
+def answer_cache_key(application_id, index_version, question, model, prompt_id):
+    return hashlib.sha256("\0".join([application_id, index_version, question, model, prompt_id]).encode("utf-8")).hexdigest()
+
+# Model name of a LangChain chat model or LLM (ChatOpenAI.model_name, Ollama.model)
+def llm_model_name(llm):
+    return getattr(llm, "model_name", None) or getattr(llm, "model", None) or type(llm).__name__
+
+# Short hash identifying a prompt template, so answers produced with an edited prompt are not reused
+def prompt_id(template):
+    return hashlib.sha256(str(template).encode("utf-8")).hexdigest()[:16]
+
+# Prompt of load_qa_chain(llm, chain_type="stuff"), which differs between chat models and plain LLMs
+def qa_prompt_id(llm):
+    from langchain.chains.question_answering.stuff_prompt import PROMPT_SELECTOR
+    return prompt_id(repr(PROMPT_SELECTOR.get_prompt(llm)))
+
+class AnswerCache:
+    """Persistent question -> answer store. Entries of an application are only valid for the index version
+    they were generated against; invalidate() drops the others once the index changes."""
+
+    def __init__(self, path=ANSWER_CACHE_PATH):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            "key TEXT PRIMARY KEY, application_id TEXT NOT NULL, index_version TEXT NOT NULL, "
+            "answer TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS answers_application ON answers (application_id)")
+        self._conn.commit()
+
+    # {question: answer} of the questions answered before for this application, index version, model and prompt
+    def get_many(self, application_id, index_version, model, prompt, questions):
+        keys = {answer_cache_key(application_id, index_version, question, model, prompt): question for question in questions}
+        found = {}
+        with self._lock:
+            key_list = list(keys)
+            for start in range(0, len(key_list), 500):
+                batch = key_list[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                for key, answer in self._conn.execute(f"SELECT key, answer FROM answers WHERE key IN ({placeholders})", batch):
+                    found[keys[key]] = answer
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, application_id, index_version, model, prompt, answers):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO answers (key, application_id, index_version, answer, created) VALUES (?, ?, ?, ?, ?)",
+                [(answer_cache_key(application_id, index_version, question, model, prompt), application_id, index_version, answer, now)
+                 for question, answer in answers.items()]
+            )
+            self._conn.commit()
+
+    # Drop an application's answers, except those generated against keep_version (the current index)
+    def invalidate(self, application_id, keep_version=None):
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM answers WHERE application_id = ? AND index_version != ?", (application_id, keep_version or "")
+            )
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": entries,
+        }
+
+_answer_cache = None
+_answer_cache_lock = threading.Lock()
+
+# Process-wide cache instance shared by the FAQ and report pages
+def get_answer_cache():
+    global _answer_cache
+    with _answer_cache_lock:
+        if _answer_cache is None:
+            _answer_cache = AnswerCache()
+        return _answer_cache
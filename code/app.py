@@ -1,14 +1,32 @@
 import streamlit as st
-from user_authentication import main as user_authentication
-from doc_generator_page import doc_generator_page
-from chat_with_doc import chat_with_doc
-from faq_handler import faqs_page
-from history_page import history_page
-from quiz_page import quiz_page
-from training_page import training_page
-from document_comparison_page import document_comparison_page
-from generate_procedure_manual_page import generate_procedure_manual_page
-from document_comparison_with_reference import document_comparison_with_reference
+import importlib
+import sys
+import uuid
+from llm_scheduler import request_context
+
+# Page registry: page name -> (module, function). Modules are imported only when their page is selected,
+# so the heavy libraries they pull in (langchain, reportlab, fitz, ...) are not loaded on startup.
+PAGES = {
+    'User Authentication': ('user_authentication', 'main'),
+    'Doc Generator': ('doc_generator_page', 'doc_generator_page'),
+    'Chat With Doc': ('chat_with_doc', 'chat_with_doc'),
+    'FAQs': ('faq_handler', 'faqs_page'),
+    'Quiz': ('quiz_page', 'quiz_page'),
+    'Training': ('training_page', 'training_page'),
+    'Document Comparison Page': ('document_comparison_page', 'document_comparison_page'),
+    'Generate Procedure Manual': ('generate_procedure_manual_page', 'generate_procedure_manual_page'),
+    'Doc Comparison With Reference Doc': ('document_comparison_with_reference', 'document_comparison_with_reference'),
+    'History': ('history_page', 'history_page'),
+}
+
+def load_page(name):
+    module_name, function_name = PAGES[name]
+    return getattr(importlib.import_module(module_name), function_name)
+
+# Run a page with its LLM requests queued under this browser session, so concurrent sessions take turns
+def run_page(name):
+    with request_context(user=st.session_state.setdefault("llm_user", uuid.uuid4().hex)):
+        load_page(name)()
 
 def welcome_page():
     st.markdown("<h1 style='text-align: center; font-family: Arial; color: #4CAF50;'>Operational AI Assistant</h1>", unsafe_allow_html=True)
@@ -67,24 +85,20 @@ elif selection == 'OA Generator':
         ['User Authentication', 'Doc Generator', 'Chat With Doc', 'FAQs', 'Quiz', 'Training', 'Document Comparison Page','Generate Procedure Manual','Doc Comparison With Reference Doc'],
         format_func=lambda x: f"{icons[x]} {x}"
     )
-    if sub_selection == 'User Authentication':
-        user_authentication()
-    elif sub_selection == 'Doc Generator':
-        doc_generator_page()
-    elif sub_selection == 'Chat With Doc':
-        chat_with_doc()
-    elif sub_selection == 'FAQs':
-        faqs_page()
-    elif sub_selection== 'Quiz':
-        quiz_page()
-    elif sub_selection== 'Training':
-        training_page()
-    elif sub_selection== 'Document Comparison Page':
-        document_comparison_page()
-    elif sub_selection== 'Generate Procedure Manual':
-        generate_procedure_manual_page()
-    elif sub_selection== 'Doc Comparison With Reference Doc':
-        document_comparison_with_reference()
+    run_page(sub_selection)
 
 elif selection == 'History':
-    history_page()
+    run_page('History')
+
+# LLM latency and connection reuse, once a page has called a model in this process
+if "llm_gateway" in sys.modules:
+    with st.sidebar.expander("LLM gateway"):
+        for provider, stats in sorted(sys.modules["llm_gateway"].gateway_stats().items()):
+            st.caption(f"{provider}: {stats['calls']} calls ({stats['errors']} failed), avg {stats['avg_ms']:.0f} ms, "
+                       f"p95 {stats['p95_ms']:.0f} ms, {stats['connections_opened']} connections for "
+                       f"{stats['requests']} requests ({stats['connection_reuse_rate']:.0%} reused)")
+        scheduler = sys.modules["llm_scheduler"].scheduler_stats()
+        for name, stats in scheduler["priorities"].items():
+            st.caption(f"{name} queue: {stats['queue_depth']} waiting from {stats['waiting_users']} sessions, "
+                       f"{stats['granted']} sent, wait avg {stats['avg_wait_ms']:.0f} ms, p95 {stats['p95_wait_ms']:.0f} ms")
+        st.caption(f"429 responses: {scheduler['throttled']}, retries: {scheduler['retries']}")
@@ -0,0 +1,80 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from llm_gateway import chat
+from llm_scheduler import with_request_context
+from translation_memory import get_translation_memory
+
+TRANSLATION_MODEL = "gpt-4o"
+TRANSLATION_WORKERS = int(os.getenv("OA_TRANSLATION_WORKERS", "8"))
+CONTENT_NOT_AVAILABLE = "المحتوى غير متوفر."
+
+def translate_single_item(item):
+    text = str(item)
+    if not text.strip():
+        return text
+    # Check the persistent translation memory before calling the API
+    memory = get_translation_memory()
+    cached = memory.get(text, TRANSLATION_MODEL)
+    if cached is not None:
+        return cached
+    try:
+        translation = chat(
+            model=TRANSLATION_MODEL,
+            messages=[
+                {"role": "system", "content": "You are a helpful translator. Translate the following text to Arabic."},
+                {"role": "user", "content": text}
+            ]
+        )
+    except Exception as e:
+        print(f"Error during translation: {e}")
+        return item  # Return the original item if translation fails
+    memory.put(text, TRANSLATION_MODEL, translation)
+    return translation
+
+def translate_to_arabic(text):
+    # Handle different input types
+    if isinstance(text, str):
+        return translate_single_item(text)
+    elif isinstance(text, list):
+        return [translate_single_item(item) for item in text]
+    elif isinstance(text, dict):
+        return {key: translate_single_item(value) for key, value in text.items()}
+    else:
+        print(f"Unsupported input type: {type(text)}")
+        return text
+
+# Translate a dict of key -> text concurrently; identical texts are only sent once
+def translate_many(items, max_workers=TRANSLATION_WORKERS):
+    unique_texts = []
+    for value in items.values():
+        if isinstance(value, str) and value not in unique_texts:
+            unique_texts.append(value)
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        translated = dict(zip(unique_texts, executor.map(with_request_context(translate_single_item), unique_texts)))
+        others = {key: executor.submit(with_request_context(translate_to_arabic), value) for key, value in items.items() if not isinstance(value, str)}
+
+    results = {}
+    for key, value in items.items():
+        results[key] = translated[value] if isinstance(value, str) else others[key].result()
+    return results
+
+# Translate every section title and body of a memo template in one concurrent pass.
+# Returns (titles, contents), both keyed by content_key (titles of sections without one are keyed by title).
+def translate_memo_sections(memo_content, template):
+    titles = {}
+    contents = {}
+    for section in template["template"]["sections"]:
+        # A top-level section without a content_key only renders its subsections
+        entries = ([section] if section.get("content_key") else []) + section.get("subsections", [])
+        for entry in entries:
+            content_key = entry.get("content_key", None)
+            titles[content_key or entry["title"]] = entry["title"]
+            if content_key and content_key in memo_content:
+                contents[content_key] = memo_content[content_key]
+
+    translated = translate_many({**{("title", key): value for key, value in titles.items()},
+                                 **{("content", key): value for key, value in contents.items()}})
+    translated_titles = {key: translated[("title", key)] for key in titles}
+    translated_contents = {key: translated[("content", key)] for key in contents}
+    return translated_titles, translated_contents
@@ -0,0 +1,56 @@
+# Compare the per-question report loop against the single-call batched mode, and per-question against batched retrieval.
+# Usage (from the repository root): python code/benchmark_batched_report.py <application_id> [runs]
+import sys
+import time
+from langchain.callbacks import get_openai_callback
+from resources import get_text_embeddings
+from llm_gateway import get_chat_openai
+from retrieval import retrieve_for_questions
+from index_manager import load_embeddings
+from doc_generator_page import read_constant_questions, process_question, process_questions_batched
+
+def run_per_question(questions, vectorstore, llm):
+    return {question: process_question(question, vectorstore, llm)[1] for question in questions}
+
+def run_batched(questions, vectorstore, llm):
+    return process_questions_batched(questions, vectorstore, llm)
+
+def measure(name, fn, questions, vectorstore, llm, runs):
+    wall_times = []
+    for _ in range(runs):
+        with get_openai_callback() as cb:
+            start_time = time.time()
+            answers = fn(questions, vectorstore, llm)
+            wall_times.append(time.time() - start_time)
+    print(f"{name:<14} wall={sum(wall_times) / runs:7.2f}s  prompt_tokens={cb.prompt_tokens:6d}  "
+          f"completion_tokens={cb.completion_tokens:6d}  requests={cb.successful_requests:3d}  answered={len(answers)}/{len(questions)}")
+
+def measure_retrieval(questions, vectorstore, runs):
+    for name, fn in (("per-question", lambda: {q: vectorstore.similarity_search(query=q, k=3) for q in questions}),
+                     ("batched", lambda: retrieve_for_questions(vectorstore, questions, k=3))):
+        start_time = time.time()
+        for _ in range(runs):
+            fn()
+        print(f"retrieval {name:<14} {(time.time() - start_time) / runs:7.3f}s")
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python code/benchmark_batched_report.py <application_id> [runs]")
+        return
+    application_id = sys.argv[1]
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+
+    vectorstore = load_embeddings(application_id, get_text_embeddings())
+    if vectorstore is None:
+        print(f"No embeddings found for application ID {application_id}")
+        return
+
+    questions = read_constant_questions()
+    llm = get_chat_openai()
+    print(f"{len(questions)} questions, {runs} run(s) each (tokens are from the last run)")
+    measure("per-question", run_per_question, questions, vectorstore, llm, runs)
+    measure("batched", run_batched, questions, vectorstore, llm, runs)
+    measure_retrieval(questions, vectorstore, runs)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# Compare difflib against the diff engines on synthetic procedure-manual sized documents.
+# Usage (from the repository root): python code/benchmark_diff.py [pages] [lines_per_page] [edit_rate]
+import sys
+import time
+import random
+import difflib
+from diff_engine import DIFF_ENGINES, additions_and_deletions, render_html_diff
+
+WORDS = ("account", "branch", "customer", "IBPS", "T24", "COPs", "verify", "upload", "signature", "manager",
+         "compliance", "document", "approve", "scan", "KYC", "CR", "number", "debit", "card", "alert")
+
+def synthetic_document(pages, lines_per_page, seed=7):
+    rng = random.Random(seed)
+    lines = []
+    for page in range(pages):
+        lines.append(f"Section {page + 1}")
+        for _ in range(lines_per_page - 1):
+            lines.append(" ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 12))))
+        lines.append("")
+    return lines
+
+# Copy of the document with a fraction of lines changed, inserted or deleted.
+# Edits come in runs of consecutive lines, like a rewritten paragraph, which is where Differ gets slow.
+def edited_copy(lines, edit_rate, seed=11, run_length=30):
+    rng = random.Random(seed)
+    edited = []
+    index = 0
+    while index < len(lines):
+        if rng.random() < edit_rate / run_length:
+            for line in lines[index:index + run_length]:
+                words = line.split()
+                if words:
+                    words[rng.randrange(len(words))] = rng.choice(WORDS)
+                edited.append(" ".join(words))
+            if rng.random() < 0.5:
+                edited.append(" ".join(rng.choice(WORDS) for _ in range(6)))
+            index += run_length
+        else:
+            edited.append(lines[index])
+            index += 1
+    return edited
+
+def timed(fn):
+    start_time = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start_time, result
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    lines_per_page = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    edit_rate = float(sys.argv[3]) if len(sys.argv) > 3 else 0.05
+
+    old_lines = synthetic_document(pages, lines_per_page)
+    new_lines = edited_copy(old_lines, edit_rate)
+    print(f"{len(old_lines)} vs {len(new_lines)} lines, edit rate {edit_rate:.0%}")
+
+    baseline, diff = timed(lambda: list(difflib.Differ().compare(old_lines, new_lines)))
+    print(f"difflib.Differ.compare (memo prompts)   {baseline:8.3f}s")
+    expected = sum(1 for line in diff if line[:2] in ("+ ", "- "))
+
+    for name, engine in DIFF_ENGINES.items():
+        elapsed, opcodes = timed(lambda: engine(old_lines, new_lines))
+        additions, deletions = additions_and_deletions(old_lines, new_lines, opcodes)
+        print(f"{name:<10} opcodes + additions        {elapsed:8.3f}s  speedup {baseline / elapsed:7.1f}x  "
+              f"changed lines {len(additions) + len(deletions)} (Differ: {expected})")
+
+    baseline, _ = timed(lambda: difflib.HtmlDiff().make_file(old_lines, new_lines, context=True, numlines=1000))
+    print(f"difflib.HtmlDiff.make_file (viewer)     {baseline:8.3f}s")
+    elapsed, _ = timed(lambda: render_html_diff(old_lines, new_lines, context=True, numlines=1000))
+    print(f"render_html_diff                        {elapsed:8.3f}s  speedup {baseline / elapsed:7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+# Compare serial extraction with the process-pool extraction service on synthetic PDFs.
+# Usage (from the repository root): python code/benchmark_extraction.py [documents] [pages_per_document]
+import sys
+import time
+from collections import namedtuple
+import fitz
+from extraction import extract_documents, extract_one, _extract_uncached, EXTRACTION_WORKERS
+
+Upload = namedtuple("Upload", ["name", "type", "data"])
+Upload.getvalue = lambda self: self.data
+
+def synthetic_pdf(pages, seed):
+    doc = fitz.open()
+    for page_number in range(pages):
+        page = doc.new_page()
+        page.insert_text((40, 30), f"Section {page_number + 1}: Account Opening", fontsize=14)
+        text = "\n".join(f"Document {seed} page {page_number + 1} line {line}: the Personal Banker uploads the scanned "
+                         f"KYC documents to IBPS before COPs authorises the account in T24." for line in range(45))
+        page.insert_textbox(fitz.Rect(40, 40, 560, 800), text, fontsize=8)
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+def main():
+    documents = int(sys.argv[1]) if len(sys.argv) > 1 else 12
+    pages = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    uploads = [Upload(f"doc_{i}.pdf", "application/pdf", synthetic_pdf(pages, i)) for i in range(documents)]
+    total_pages = documents * pages
+    print(f"{documents} PDFs x {pages} pages, {EXTRACTION_WORKERS} workers")
+
+    jobs = [(upload.type, upload.data) for upload in uploads]
+    start_time = time.perf_counter()
+    serial = [extract_one(*job) for job in jobs]
+    serial_time = time.perf_counter() - start_time
+
+    _extract_uncached(jobs[:2])  # Start the worker processes outside the timing
+    start_time = time.perf_counter()
+    parallel = _extract_uncached(jobs)
+    parallel_time = time.perf_counter() - start_time
+    assert serial == parallel
+
+    # After one pass through the service, every page profile is served from the extraction cache
+    extract_documents(uploads, "index")
+    start_time = time.perf_counter()
+    for profile in ("index", "comparison", "procedure_manual"):
+        extract_documents(uploads, profile)
+    cached_time = (time.perf_counter() - start_time) / 3
+
+    print(f"serial {total_pages / serial_time:8.1f} pages/s   process pool {total_pages / parallel_time:8.1f} pages/s   "
+          f"speedup {serial_time / parallel_time:5.2f}x   cached {total_pages / cached_time:10.1f} pages/s")
+
+if __name__ == "__main__":
+    main()
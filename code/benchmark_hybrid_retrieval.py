@@ -0,0 +1,97 @@
+# Recall@k and latency of dense, BM25 and hybrid retrieval on the sample operational documents.
+# Each labelled question counts as found when one of the top-k chunks contains its expected text.
+# Usage (from the repository root): python code/benchmark_hybrid_retrieval.py [runs]
+import os
+import re
+import sys
+import time
+import tempfile
+from dotenv import load_dotenv
+from langchain.vectorstores import FAISS
+from extraction import extract_raw, render_for_index
+from chunking import chunk_document
+from index_manager import document_hash
+from resources import get_text_embeddings
+from retrieval import similarity_search_batch
+from bm25_index import get_bm25_index
+
+SAMPLE_DOCUMENTS = [
+    "business_accounts_workflow.pdf",
+    "pdfs/procedure_manual.pdf",
+    "pdfs/operational_advice_memo.pdf",
+]
+
+# (question, text the relevant chunk must contain)
+LABELLED_QUESTIONS = [
+    ("Which IBPS queue does the branch log into to start a business account request?", "AO_BUSINESS_INITIATION"),
+    ("Which queue does the compliance team use to access work items?", "AO_BUSINESS_COMPLIANCE"),
+    ("Which queue does the Malaa team select for NRID work items?", "AO_BUSINESS_AO_BUSINESS_MOCI"),
+    ("What does the Internet Banking checker select in IBPS?", "AO_BUSINESS_IB_CHECKER"),
+    ("Which queue does the POS back-office maker use?", "AO_BUSINESS_POS_MAKER"),
+    ("Who should be contacted for IBPS technical issues?", "Retail-AO-IBPS-Helpdesk"),
+    ("What is the SLA for work items assigned to the account opening team?", "SLA of 3 days"),
+    ("Which OA guidelines does the AO maker follow to review KYC documents?", "002/2024"),
+    ("What is the number of the operations advice for IBPS business accounts?", "016/2024"),
+    ("From which date is the new system implemented across all branches?", "October 6, 2024"),
+    ("What does T24 do after the CR number or Bureau ID is entered?", "fetch matching CIF"),
+    ("Which business classifications including SAOG and SAOC can be originated?", "SAOC"),
+    ("Where should the original account opening form and KYC documents be kept?", "dual custody"),
+    ("How does the Malaa team create the NRID for non-resident customers?", "NRID number through Malaa"),
+]
+
+MODES = ["dense", "bm25", "hybrid"]
+K_VALUES = [1, 3, 5]
+
+def normalize(text):
+    return re.sub(r"\s+", " ", text).lower()
+
+def build_vectorstore(embeddings):
+    texts = []
+    metadatas = []
+    ids = []
+    for path in SAMPLE_DOCUMENTS:
+        with open(path, "rb") as f:
+            data = f.read()
+        raw = extract_raw("application/pdf", data)
+        doc_hash = document_hash(data)
+        chunks, chunk_metadatas = chunk_document(raw, render_for_index(raw))
+        texts += chunks
+        metadatas += [{"source": path, "doc_hash": doc_hash, **metadata} for metadata in chunk_metadatas]
+        ids += [f"{doc_hash[:16]}-{i}" for i in range(len(chunks))]
+    text_embeddings = list(zip(texts, embeddings.embed_documents(texts)))
+    vectorstore = FAISS.from_embeddings(text_embeddings, embeddings, metadatas=metadatas, ids=ids)
+    # Retrieval only runs BM25 against a vectorstore with an on-disk keyword index, as index_manager attaches
+    bm25_path = os.path.join(tempfile.mkdtemp(prefix="oa-bm25-"), "bm25.sqlite")
+    vectorstore.bm25_index = get_bm25_index(bm25_path, lambda: zip(ids, texts))
+    return vectorstore
+
+def main():
+    load_dotenv()
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    embeddings = get_text_embeddings()
+    vectorstore = build_vectorstore(embeddings)
+    questions = [question for question, _ in LABELLED_QUESTIONS]
+    print(f"{len(SAMPLE_DOCUMENTS)} documents, {vectorstore.index.ntotal} chunks, {len(questions)} labelled questions, {runs} runs")
+
+    # Warm up the query embeddings and the BM25 index so latency reflects steady state
+    similarity_search_batch(vectorstore, questions, k=max(K_VALUES), mode="hybrid")
+
+    for mode in MODES:
+        results = similarity_search_batch(vectorstore, questions, k=max(K_VALUES), mode=mode)
+        recalls = []
+        for k in K_VALUES:
+            found = sum(
+                any(normalize(expected) in normalize(doc.page_content) for doc in docs[:k])
+                for docs, (_, expected) in zip(results, LABELLED_QUESTIONS)
+            )
+            recalls.append(f"recall@{k}={found / len(questions):.2f}")
+
+        start_time = time.perf_counter()
+        for _ in range(runs):
+            for question in questions:
+                similarity_search_batch(vectorstore, [question], k=3, mode=mode)
+        latency_ms = (time.perf_counter() - start_time) / (runs * len(questions)) * 1000
+        print(f"{mode:<7} {'  '.join(recalls)}  latency={latency_ms:6.2f} ms/query")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# Recall, latency and memory of the Flat, HNSW and IVF-PQ index types on synthetic embedding-like vectors.
+# Recall@k is measured against exact (Flat) search; HNSW and IVF-PQ are swept over efSearch / nprobe.
+# Usage (from the repository root): python code/benchmark_index_types.py [vectors] [dimension] [queries]
+import sys
+import time
+import numpy as np
+import faiss
+from index_factory import build_index, index_memory_bytes
+
+K = 10
+EF_SEARCH_VALUES = [16, 32, 64, 128]
+NPROBE_VALUES = [1, 4, 16, 64]
+
+# Clustered, L2-normalized vectors with a low intrinsic dimension: real chunk embeddings are neither
+# uniform nor isotropic. Points are drawn in a small latent space and projected up with a fixed basis.
+def synthetic_vectors(count, dimension, clusters=256, latent_dimension=64, seed=0):
+    basis = np.random.default_rng(12345).standard_normal((latent_dimension, dimension)).astype(np.float32)
+    centers = np.random.default_rng(54321).standard_normal((clusters, latent_dimension)).astype(np.float32)
+    rng = np.random.default_rng(seed)
+    latent = centers[rng.integers(0, clusters, count)] + 0.5 * rng.standard_normal((count, latent_dimension)).astype(np.float32)
+    vectors = latent @ basis + 0.05 * rng.standard_normal((count, dimension)).astype(np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+def recall_at_k(found, truth):
+    return np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)])
+
+# Search one query at a time, as the pages do
+def measure(index, queries, truth):
+    start_time = time.perf_counter()
+    found = [index.search(query[None, :], K)[1][0] for query in queries]
+    latency_ms = (time.perf_counter() - start_time) / len(queries) * 1000
+    return recall_at_k(found, truth), latency_ms
+
+def report(name, build_seconds, index, recall, latency_ms):
+    serialized_mb = faiss.serialize_index(index).nbytes / (1024 * 1024)
+    estimated_mb = index_memory_bytes(index) / (1024 * 1024)
+    print(f"{name:<22} build {build_seconds:7.2f}s  recall@{K} {recall:5.3f}  latency {latency_ms:7.3f} ms  "
+          f"size {serialized_mb:8.1f} MB  (estimated {estimated_mb:8.1f} MB)")
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    dimension = int(sys.argv[2]) if len(sys.argv) > 2 else 1536
+    query_count = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+    vectors = synthetic_vectors(count, dimension)
+    queries = synthetic_vectors(query_count, dimension, seed=1)
+    print(f"{count} vectors, dimension {dimension}, {query_count} queries, k={K}")
+
+    results = {}
+    for index_type in ("flat", "hnsw", "ivfpq"):
+        start_time = time.perf_counter()
+        index, config = build_index(vectors, index_type)
+        results[index_type] = (index, time.perf_counter() - start_time, config)
+
+    flat, flat_build, _ = results["flat"]
+    truth = [flat.search(query[None, :], K)[1][0] for query in queries]
+    report("flat", flat_build, flat, *measure(flat, queries, truth))
+
+    hnsw, hnsw_build, _ = results["hnsw"]
+    for ef_search in EF_SEARCH_VALUES:
+        hnsw.hnsw.efSearch = ef_search
+        report(f"hnsw efSearch={ef_search}", hnsw_build, hnsw, *measure(hnsw, queries, truth))
+
+    ivfpq, ivfpq_build, config = results["ivfpq"]
+    for nprobe in NPROBE_VALUES:
+        faiss.extract_index_ivf(ivfpq).nprobe = min(nprobe, config["nlist"])
+        report(f"{config['factory']} nprobe={nprobe}", ivfpq_build, ivfpq, *measure(ivfpq, queries, truth))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+# Compare the old text + blocks PDF extraction of the comparison pages with the single-pass layout extractor.
+# Usage (from the repository root): python code/benchmark_layout_extraction.py [pages] [runs]
+import sys
+import time
+import fitz
+from extraction import extract_raw, render_for_comparison, preprocess_text, detect_headings
+from diff_engine import diff_opcodes
+from benchmark_extraction import synthetic_pdf
+
+# What extract_text_from_pdf in the comparison pages used to do: every page's text, then the same text again as blocks
+def extract_text_and_blocks(data):
+    doc = fitz.open(stream=data, filetype="pdf")
+    full_text = []
+    for page in doc:
+        full_text.append(page.get_text("text"))
+        for block in page.get_text("blocks") or []:
+            if block[-1] == 0:
+                full_text.append(block[4])
+    doc.close()
+    return preprocess_text("\n".join(full_text))
+
+def extract_single_pass(data):
+    return render_for_comparison(extract_raw("application/pdf", data))
+
+def timed(fn, runs):
+    start_time = time.perf_counter()
+    for _ in range(runs):
+        result = fn()
+    return (time.perf_counter() - start_time) / runs, result
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    old_pdf, new_pdf = synthetic_pdf(pages, 0), synthetic_pdf(pages, 1)
+    print(f"two {pages}-page PDFs, {runs} runs")
+
+    for name, extractor in (("text + blocks", extract_text_and_blocks), ("single pass", extract_single_pass)):
+        extract_time, texts = timed(lambda: (extractor(old_pdf), extractor(new_pdf)), runs)
+        diff_time, _ = timed(lambda: diff_opcodes(texts[0].splitlines(), texts[1].splitlines()), runs)
+        print(f"{name:<14} extract {extract_time:7.3f}s  diff {diff_time:7.3f}s  "
+              f"lines {len(texts[0].splitlines()) + len(texts[1].splitlines()):7d}  chars {len(texts[0]) + len(texts[1]):9d}")
+
+    headings = detect_headings(extract_raw("application/pdf", old_pdf))
+    print(f"headings detected in the first PDF: {len(headings)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# Several analysts generating reports while another chats, against the local fake OpenAI server.
+# Reports 429s seen by the server, failed calls, per-analyst completion time and chat latency, with the
+# scheduler on or off (OA_LLM_SCHEDULER=0 leaves retries to the OpenAI SDK).
+# Usage (from the repository root): python code/benchmark_llm_scheduler.py [analysts] [questions] [rpm] [tpm] [on|off]
+import os
+import sys
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+ANALYSTS = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+QUESTIONS = int(sys.argv[2]) if len(sys.argv) > 2 else 15
+RPM = int(sys.argv[3]) if len(sys.argv) > 3 else 120
+TPM = int(sys.argv[4]) if len(sys.argv) > 4 else 20000
+SCHEDULER = (sys.argv[5] if len(sys.argv) > 5 else "on") == "on"
+REPORT_WORKERS = 4
+CHAT_QUESTIONS = 5
+MAX_TOKENS = 500
+
+# The scheduler reads its limits on import
+os.environ["OA_LLM_SCHEDULER"] = "1" if SCHEDULER else "0"
+os.environ["OA_OPENAI_RPM"] = str(RPM)
+os.environ["OA_OPENAI_TPM"] = str(TPM)
+os.environ.setdefault("OPENAI_API_KEY", "fake-key")
+
+from fake_openai_server import FakeOpenAIServer
+server = FakeOpenAIServer(rpm=RPM, tpm=TPM).start()
+os.environ["OPENAI_BASE_URL"] = server.base_url
+
+from llm_gateway import chat, gateway_stats
+from llm_scheduler import request_context, with_request_context, scheduler_stats, PRIORITY_INTERACTIVE
+
+failures = []
+failures_lock = threading.Lock()
+
+def ask(question):
+    start_time = time.perf_counter()
+    try:
+        chat([{"role": "user", "content": question}], max_tokens=MAX_TOKENS)
+    except Exception as e:
+        with failures_lock:
+            failures.append(f"{question[:30]}: {type(e).__name__}")
+    return time.perf_counter() - start_time
+
+# One analyst's report: QUESTIONS questions on a small worker pool, like the OA generator
+def run_report(analyst):
+    start_time = time.perf_counter()
+    with request_context(user=f"analyst-{analyst}"):
+        with ThreadPoolExecutor(max_workers=REPORT_WORKERS) as executor:
+            list(executor.map(with_request_context(ask), [f"Report question {i} from analyst {analyst}" for i in range(QUESTIONS)]))
+    return time.perf_counter() - start_time
+
+def run_chat(latencies):
+    with request_context(user="chat-analyst", priority=PRIORITY_INTERACTIVE):
+        for i in range(CHAT_QUESTIONS):
+            time.sleep(1)
+            latencies.append(ask(f"Chat question {i}"))
+
+def main():
+    print(f"{ANALYSTS} analysts x {QUESTIONS} questions + {CHAT_QUESTIONS} chat questions, "
+          f"{RPM} RPM / {TPM} TPM, scheduler {'on' if SCHEDULER else 'off'}")
+    chat_latencies = []
+    chat_thread = threading.Thread(target=run_chat, args=(chat_latencies,))
+    start_time = time.perf_counter()
+    chat_thread.start()
+    with ThreadPoolExecutor(max_workers=ANALYSTS) as executor:
+        report_times = list(executor.map(run_report, range(ANALYSTS)))
+    chat_thread.join()
+    elapsed = time.perf_counter() - start_time
+
+    print(f"total {elapsed:.1f}s, server accepted {server.accepted}, answered 429 {server.rejected}, failed calls {len(failures)}")
+    for analyst, seconds in enumerate(report_times):
+        print(f"analyst-{analyst} report finished in {seconds:.1f}s")
+    if chat_latencies:
+        chat_latencies.sort()
+        print(f"chat latency avg {sum(chat_latencies) / len(chat_latencies):.2f}s, max {chat_latencies[-1]:.2f}s")
+    print(f"gateway: {gateway_stats()}")
+    if SCHEDULER:
+        print(f"scheduler: {scheduler_stats()}")
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
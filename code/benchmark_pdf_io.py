@@ -0,0 +1,64 @@
+# Compare the old temp-file PDF extraction path with in-memory extraction.
+# Usage (from the repository root): python code/benchmark_pdf_io.py [pages] [runs]
+import os
+import sys
+import time
+import tempfile
+import tracemalloc
+import fitz
+from extraction import extract_text_from_pdf
+from benchmark_extraction import synthetic_pdf
+
+# Bytes this process has written to storage so far (Linux only)
+def written_bytes():
+    try:
+        with open("/proc/self/io", "r") as f:
+            for line in f:
+                if line.startswith("write_bytes:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+# What every page used to do: copy the upload into a NamedTemporaryFile that is never deleted, then open the path
+def extract_via_temp_file(data):
+    with tempfile.NamedTemporaryFile(delete=False) as tmp_file:
+        tmp_file.write(data)
+        tmp_file_path = tmp_file.name
+    pdf_document = fitz.open(tmp_file_path)
+    all_text = ""
+    for page in pdf_document:
+        all_text += page.get_text("text")
+    return all_text, tmp_file_path
+
+def measure(name, fn, data, runs):
+    temp_files = []
+    before_written = written_bytes()
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    for _ in range(runs):
+        result = fn(data)
+        if isinstance(result, tuple):
+            temp_files.append(result[1])
+    elapsed = time.perf_counter() - start_time
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    after_written = written_bytes()
+
+    leaked = sum(os.path.getsize(path) for path in temp_files if os.path.exists(path))
+    written = f"{(after_written - before_written) / 1e6:8.1f} MB" if before_written is not None else "     n/a"
+    print(f"{name:<12} {elapsed / runs * 1000:8.1f} ms/run  python peak {peak / 1e6:7.1f} MB  "
+          f"disk written {written}  temp files left {len(temp_files)} ({leaked / 1e6:.1f} MB)")
+    for path in temp_files:
+        os.remove(path)
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    data = synthetic_pdf(pages, 0)
+    print(f"{pages}-page PDF, {len(data) / 1e6:.1f} MB, {runs} runs")
+    measure("temp file", extract_via_temp_file, data, runs)
+    measure("in memory", extract_text_from_pdf, data, runs)
+
+if __name__ == "__main__":
+    main()
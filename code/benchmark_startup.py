@@ -0,0 +1,44 @@
+# Measure app startup and rerun cost with the lazy page registry.
+# Usage (from the repository root): python code/benchmark_startup.py [reruns]
+import os
+import sys
+import time
+import subprocess
+
+CODE_DIR = os.path.dirname(os.path.abspath(__file__))
+PAGE_MODULES = [
+    "user_authentication", "doc_generator_page", "chat_with_doc", "faq_handler", "quiz_page", "training_page",
+    "document_comparison_page", "generate_procedure_manual_page", "document_comparison_with_reference", "history_page",
+]
+
+# Time a snippet in a fresh interpreter so nothing is already imported
+def cold_time(snippet):
+    script = f"import sys, time; sys.path.insert(0, {CODE_DIR!r}); start = time.perf_counter(); {snippet}; print(time.perf_counter() - start)"
+    output = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+def main():
+    reruns = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    eager = cold_time("import " + ", ".join(PAGE_MODULES))
+    print(f"eager import of every page module (previous app.py): {eager:6.2f}s")
+    for module_name in PAGE_MODULES:
+        print(f"  cold import {module_name:<36} {cold_time('import ' + module_name):6.2f}s")
+
+    from streamlit.testing.v1 import AppTest
+    sys.path.insert(0, CODE_DIR)
+    app = AppTest.from_file(os.path.join(CODE_DIR, "app.py"), default_timeout=120)
+
+    start_time = time.perf_counter()
+    app.run()
+    print(f"cold first run of app.py (Welcome page): {time.perf_counter() - start_time:6.2f}s")
+
+    warm_times = []
+    for _ in range(reruns):
+        start_time = time.perf_counter()
+        app.run()
+        warm_times.append(time.perf_counter() - start_time)
+    print(f"warm rerun of app.py: avg {sum(warm_times) / reruns:6.3f}s over {reruns} reruns")
+
+if __name__ == "__main__":
+    main()
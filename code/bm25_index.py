@@ -0,0 +1,118 @@
+import os
+import re
+import sqlite3
+import itertools
+import threading
+
+_TOKEN_PATTERN = re.compile(r"\w+(?:[-/.]\w+)*")
+
+# Lowercased word tokens. Identifiers such as "AO_BUSINESS_INITIATION", "016/2024" or "Retail-AO-IBPS"
+# are kept whole and also split into their parts, so both the exact identifier and its pieces match.
+def tokenize(text):
+    tokens = []
+    for token in _TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(token)
+        parts = [part for part in re.split(r"[-/._]", token) if part]
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+class BM25Index:
+    """BM25 keyword index of an application's chunks in an SQLite FTS5 table on disk. It is updated as
+    documents are indexed or replaced, and a search reads only the postings of the query terms, so
+    neither the chunk texts nor the postings are held in memory."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        _create_tables(self._conn)
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunk_rows").fetchone()[0]
+
+    def add(self, chunk_ids, texts):
+        with self._lock:
+            _delete_rows(self._conn, chunk_ids)
+            _insert_rows(self._conn, chunk_ids, texts)
+            self._conn.commit()
+
+    def remove(self, chunk_ids):
+        with self._lock:
+            _delete_rows(self._conn, chunk_ids)
+            self._conn.commit()
+
+    # [(chunk_id, score)] of the best k chunks for the query, highest score first
+    def search(self, query, k=10):
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        match = " OR ".join(f'"{term}"' for term in terms)
+        with self._lock:
+            return self._conn.execute(
+                "SELECT chunk_rows.chunk_id, -bm25(chunk_terms) AS score FROM chunk_terms "
+                "JOIN chunk_rows ON chunk_rows.row = chunk_terms.rowid "
+                "WHERE chunk_terms MATCH ? ORDER BY bm25(chunk_terms) LIMIT ?",
+                (match, k)
+            ).fetchall()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+# The FTS5 table holds the tokenize() output, and its tokenizer keeps those tokens whole.
+# chunk_rows maps chunk ids to FTS rowids, so a chunk is removed without scanning the table.
+def _create_tables(conn):
+    conn.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS chunk_terms USING fts5(terms, tokenize = \"unicode61 tokenchars '-/._'\")"
+    )
+    conn.execute("CREATE TABLE IF NOT EXISTS chunk_rows (row INTEGER PRIMARY KEY, chunk_id TEXT NOT NULL UNIQUE)")
+    conn.commit()
+
+def _insert_rows(conn, chunk_ids, texts):
+    for chunk_id, text in zip(chunk_ids, texts):
+        row = conn.execute("INSERT INTO chunk_rows (chunk_id) VALUES (?)", (chunk_id,)).lastrowid
+        conn.execute("INSERT INTO chunk_terms (rowid, terms) VALUES (?, ?)", (row, " ".join(tokenize(text))))
+
+def _delete_rows(conn, chunk_ids):
+    for chunk_id in chunk_ids:
+        found = conn.execute("SELECT row FROM chunk_rows WHERE chunk_id = ?", (chunk_id,)).fetchone()
+        if found:
+            conn.execute("DELETE FROM chunk_terms WHERE rowid = ?", found)
+            conn.execute("DELETE FROM chunk_rows WHERE row = ?", found)
+
+# Write a new index file from (chunk_id, text) pairs, 1000 chunks per insert, and move it into place
+def _build(path, items):
+    tmp_path = path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        _create_tables(conn)
+        batch = []
+        for item in itertools.chain(items, [None]):
+            if item is not None:
+                batch.append(item)
+            if batch and (item is None or len(batch) >= 1000):
+                _insert_rows(conn, [chunk_id for chunk_id, _ in batch], [text for _, text in batch])
+                batch = []
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp_path, path)
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+# Process-wide BM25 index stored at path. A missing file is first built from items(), an iterable of
+# (chunk_id, text) for indexes created before the keyword index was kept on disk.
+def get_bm25_index(path, items=None):
+    with _indexes_lock:
+        index = _indexes.get(path)
+        if index is None:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            if items is not None and not os.path.exists(path):
+                _build(path, items())
+            index = _indexes[path] = BM25Index(path)
+        return index
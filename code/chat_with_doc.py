@@ -3,9 +3,12 @@ from PyPDF2 import PdfReader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.embeddings.openai import OpenAIEmbeddings
 from langchain.vectorstores import FAISS
-from langchain.chat_models import ChatOpenAI
+from llm_gateway import get_chat_openai
+from llm_scheduler import request_context, PRIORITY_INTERACTIVE
+from retrieval import similarity_search_batch
 from langchain.chains.question_answering import load_qa_chain
 from langchain.callbacks import get_openai_callback
+from langchain.callbacks.base import BaseCallbackHandler
 import os
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.styles import getSampleStyleSheet
@@ -16,6 +19,23 @@ import uuid
 import datetime
 from PIL import Image
 
+def format_turn(question, response):
+    return f"❔ **Question:** {question}\n\n🤖 **Response:** {response}\n\n"
+
+# Writes the answer into a placeholder token by token and records when the first token arrived
+class StreamToPlaceholder(BaseCallbackHandler):
+    def __init__(self, placeholder, question):
+        self.placeholder = placeholder
+        self.question = question
+        self.text = ""
+        self.first_token_time = None
+
+    def on_llm_new_token(self, token, **kwargs):
+        if self.first_token_time is None:
+            self.first_token_time = time.time()
+        self.text += token
+        self.placeholder.markdown(format_turn(self.question, self.text + "▌"))
+
 def chat_with_doc():
     start_time = time.time()
     
@@ -49,27 +69,35 @@ def chat_with_doc():
 
     user_question = st.text_input("👨‍💼 Ask anything to the chat", key="user_question")
 
+    # Display the question-response history, one element per turn so a new question only adds an element
+    history = response_placeholder.container()
+    for question, response in st.session_state.qa_history:
+        history.markdown(format_turn(question, response))
+
+    first_token_time = None
     if user_question:
-        llm = ChatOpenAI(model="gpt-4o")
-        docs = vectorstore.similarity_search(query=user_question, k=3)
-        
-        chain = load_qa_chain(llm=llm, chain_type="stuff")
-        with get_openai_callback() as cb:
-            response = chain.run(input_documents=docs, question=user_question)
-        
-        st.session_state.qa_history.append((user_question, response))
+        llm = get_chat_openai(model="gpt-4o", streaming=True)
+        docs = similarity_search_batch(vectorstore, [user_question], k=3)[0]
 
-        # Display the question-response history
-        response_text = ""
-        for question, response in st.session_state.qa_history:
-            response_text += f"❔ **Question:** {question}\n\n🤖 **Response:** {response}\n\n"
+        # Stream the answer into the new turn's placeholder as the tokens arrive
+        turn_placeholder = history.empty()
+        turn_placeholder.markdown(format_turn(user_question, "▌"))
+        stream_handler = StreamToPlaceholder(turn_placeholder, user_question)
+        chain = load_qa_chain(llm=llm, chain_type="stuff")
+        # Chat questions are sent ahead of queued report, FAQ and memo requests
+        with get_openai_callback() as cb, request_context(priority=PRIORITY_INTERACTIVE):
+            response = chain.run(input_documents=docs, question=user_question, callbacks=[stream_handler])
+        turn_placeholder.markdown(format_turn(user_question, response))
+        first_token_time = stream_handler.first_token_time
 
-        response_placeholder.markdown(response_text)
+        st.session_state.qa_history.append((user_question, response))
         # Clear the text input value after the response is displayed
         # st.session_state.user_question = ""
 
     end_time = time.time()
     elapsed_time = end_time - start_time
+    if first_token_time is not None:
+        print(f"Time to first token: {first_token_time - start_time:.2f} seconds")
     print(f"Total time taken: {elapsed_time:.2f} seconds")
 
 if __name__ == "__main__":
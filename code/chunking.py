@@ -0,0 +1,88 @@
+import os
+from functools import lru_cache
+
+# Token budget of one indexed chunk and the overlap carried into the next one (overridable through .env)
+CHUNK_TOKENS = int(os.getenv("OA_CHUNK_TOKENS", "500"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("OA_CHUNK_OVERLAP_TOKENS", "50"))
+# Encoding of the OpenAI embedding models
+CHUNK_ENCODING = os.getenv("OA_CHUNK_ENCODING", "cl100k_base")
+
+@lru_cache(maxsize=None)
+def get_encoding(name=CHUNK_ENCODING):
+    import tiktoken
+    return tiktoken.get_encoding(name)
+
+# (page_number, text) pairs of one document. PDFs keep their pages; other files are a single page numbered None.
+def document_pages(raw, text):
+    if raw is not None and raw.get("kind") == "pdf":
+        return list(enumerate(raw["pages"], start=1))
+    return [(None, text)]
+
+# Lines longer than the budget are cut into token windows so no chunk goes over it
+def _split_long_line(line, tokens, max_tokens, encoding):
+    for start in range(0, len(tokens), max_tokens):
+        window = tokens[start:start + max_tokens]
+        yield encoding.decode(window), len(window)
+
+# Pack the non-empty lines of consecutive pages into chunks of at most max_tokens tokens.
+# Chunks never span documents; a chunk may continue onto the next page, in which case its
+# metadata has the first page in "page" and the last one in "page_end".
+# Yields (chunk_text, metadata).
+def chunk_pages(pages, max_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS, encoding=None):
+    encoding = encoding or get_encoding()
+    max_tokens = max(1, max_tokens)
+    overlap_tokens = min(max(0, overlap_tokens), max_tokens // 2)
+    current = []  # (line, token_count, page_number)
+    current_tokens = 0
+    has_new_lines = False  # False while current holds only the overlap of the previous chunk
+
+    def emit():
+        first_page = current[0][2]
+        last_page = current[-1][2]
+        metadata = {}
+        if first_page is not None:
+            metadata["page"] = first_page
+            if last_page != first_page:
+                metadata["page_end"] = last_page
+        return "\n".join(line for line, _, _ in current), metadata
+
+    def carry_overlap():
+        # Keep the trailing lines that fit in the overlap so context flows into the next chunk
+        carried = []
+        carried_tokens = 0
+        for entry in reversed(current):
+            if carried_tokens + entry[1] > overlap_tokens:
+                break
+            carried.insert(0, entry)
+            carried_tokens += entry[1]
+        return carried, carried_tokens
+
+    for page_number, text in pages:
+        for line in text.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            tokens = encoding.encode(line, disallowed_special=())
+            pieces = _split_long_line(line, tokens, max_tokens, encoding) if len(tokens) > max_tokens else [(line, len(tokens))]
+            for piece, piece_tokens in pieces:
+                if current and current_tokens + piece_tokens > max_tokens:
+                    yield emit()
+                    current, current_tokens = carry_overlap()
+                    has_new_lines = False
+                    if current_tokens + piece_tokens > max_tokens:
+                        current, current_tokens = [], 0
+                current.append((piece, piece_tokens, page_number))
+                current_tokens += piece_tokens
+                has_new_lines = True
+
+    if has_new_lines:
+        yield emit()
+
+# Texts and metadatas of one extracted document, ready for index_document
+def chunk_document(raw, text, max_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    texts = []
+    metadatas = []
+    for chunk, metadata in chunk_pages(document_pages(raw, text), max_tokens, overlap_tokens):
+        texts.append(chunk)
+        metadatas.append(metadata)
+    return texts, metadatas
@@ -0,0 +1,50 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from diff_engine import DIFF_ENGINE, diff_opcodes, additions_and_deletions, render_html_diff
+
+COMPARISON_CACHE_SIZE = int(os.getenv("OA_COMPARISON_CACHE_SIZE", "32"))
+
+# sha256 of a text or of an upload's bytes/memoryview
+def content_hash(data):
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+class ComparisonResult:
+    """Diff of two extracted documents, shared by the HTML viewer and the memo prompts."""
+
+    def __init__(self, doc1_text, doc2_text, engine=None):
+        self.doc1_text = doc1_text
+        self.doc2_text = doc2_text
+        self.doc1_lines = doc1_text.splitlines()
+        self.doc2_lines = doc2_text.splitlines()
+        self.opcodes = diff_opcodes(self.doc1_lines, self.doc2_lines, engine)
+        self.additions, self.deletions = additions_and_deletions(self.doc1_lines, self.doc2_lines, self.opcodes)
+        self._html_diff = {}
+
+    # Rendered side-by-side view, built on first use for each context size
+    def html_diff(self, context=True, numlines=1000):
+        key = (context, numlines)
+        if key not in self._html_diff:
+            self._html_diff[key] = render_html_diff(self.doc1_lines, self.doc2_lines, context=context, numlines=numlines, opcodes=self.opcodes)
+        return self._html_diff[key]
+
+_lock = threading.Lock()
+_results = OrderedDict()  # (doc1 hash, doc2 hash, engine) -> ComparisonResult
+
+# Compare two texts once per pair of content hashes; later calls for the same pair return the cached result
+def compare_documents(doc1_text, doc2_text, engine=None):
+    key = (content_hash(doc1_text), content_hash(doc2_text), engine or DIFF_ENGINE)
+    with _lock:
+        if key in _results:
+            _results.move_to_end(key)
+            return _results[key]
+
+    result = ComparisonResult(doc1_text, doc2_text, engine)
+    with _lock:
+        _results[key] = result
+        while len(_results) > COMPARISON_CACHE_SIZE:
+            _results.popitem(last=False)
+    return result
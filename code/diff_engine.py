@@ -0,0 +1,286 @@
+import os
+import html
+import difflib
+from bisect import bisect_left
+from collections import Counter
+
+# Diff engine used by the comparison pages: "patience" (default), "myers" or "difflib"
+DIFF_ENGINE = os.getenv("OA_DIFF_ENGINE", "patience")
+# Regions that need more edits than this are matched with difflib instead of being searched further
+MYERS_MAX_EDITS = int(os.getenv("OA_DIFF_MAX_EDITS", "500"))
+
+# Map every distinct line to an int so the algorithms compare ints instead of strings
+def intern_lines(a_lines, b_lines):
+    ids = {}
+    a = [ids.setdefault(line, len(ids)) for line in a_lines]
+    b = [ids.setdefault(line, len(ids)) for line in b_lines]
+    return a, b
+
+# Middle snake of the region's shortest edit script (Myers' linear-space refinement): run the forward and
+# reverse searches from opposite corners until they overlap. Returns the snake (x, y, u, v) in region
+# coordinates, or None when the region needs more than max_edits edits.
+def _middle_snake(a, b, alo, ahi, blo, bhi, max_edits):
+    n, m = ahi - alo, bhi - blo
+    delta = n - m
+    odd = delta % 2 == 1
+    forward = {1: 0}
+    reverse = {1: 0}  # x measured back from (n, m), indexed by diagonal in the reversed region
+    for d in range((n + m + 1) // 2 + 1):
+        if 2 * d - 1 > max_edits:
+            return None
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and forward[k - 1] < forward[k + 1]):
+                x = forward[k + 1]
+            else:
+                x = forward[k - 1] + 1
+            y = x - k
+            x0, y0 = x, y
+            while x < n and y < m and a[alo + x] == b[blo + y]:
+                x += 1
+                y += 1
+            forward[k] = x
+            if odd and -(d - 1) <= delta - k <= d - 1 and x + reverse[delta - k] >= n:
+                return x0, y0, x, y
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and reverse[k - 1] < reverse[k + 1]):
+                x = reverse[k + 1]
+            else:
+                x = reverse[k - 1] + 1
+            y = x - k
+            x0, y0 = x, y
+            while x < n and y < m and a[ahi - 1 - x] == b[bhi - 1 - y]:
+                x += 1
+                y += 1
+            reverse[k] = x
+            if not odd and -d <= delta - k <= d and x + forward[delta - k] >= n:
+                return n - x, m - y, n - x0, m - y0
+    return None
+
+# Myers O((N+M)D) shortest edit script in linear space; appends matching (i, j) pairs of the region to matches.
+# Regions needing more than MYERS_MAX_EDITS edits are matched by difflib instead of being searched further.
+def _myers_matches(a, b, alo, ahi, blo, bhi, matches):
+    while alo < ahi and blo < bhi and a[alo] == b[blo]:
+        matches.append((alo, blo))
+        alo += 1
+        blo += 1
+    suffix = []
+    while alo < ahi and blo < bhi and a[ahi - 1] == b[bhi - 1]:
+        ahi -= 1
+        bhi -= 1
+        suffix.append((ahi, bhi))
+
+    if alo < ahi and blo < bhi:
+        snake = _middle_snake(a, b, alo, ahi, blo, bhi, MYERS_MAX_EDITS)
+        if snake is None:
+            matcher = difflib.SequenceMatcher(None, a[alo:ahi], b[blo:bhi], autojunk=False)
+            for i, j, size in matcher.get_matching_blocks():
+                matches.extend((alo + i + t, blo + j + t) for t in range(size))
+        else:
+            x, y, u, v = snake
+            _myers_matches(a, b, alo, alo + x, blo, blo + y, matches)
+            matches.extend((alo + x + t, blo + y + t) for t in range(u - x))
+            _myers_matches(a, b, alo + u, ahi, blo + v, bhi, matches)
+
+    matches.extend(reversed(suffix))
+
+# Longest increasing subsequence of anchors by their position in b
+def _longest_increasing(anchors):
+    tails = []
+    tail_index = []
+    previous = [None] * len(anchors)
+    for index, (_, j) in enumerate(anchors):
+        pos = bisect_left(tails, j)
+        if pos == len(tails):
+            tails.append(j)
+            tail_index.append(index)
+        else:
+            tails[pos] = j
+            tail_index[pos] = index
+        previous[index] = tail_index[pos - 1] if pos else None
+    result = []
+    index = tail_index[-1] if tail_index else None
+    while index is not None:
+        result.append(anchors[index])
+        index = previous[index]
+    return list(reversed(result))
+
+# Patience diff: anchor on lines that occur exactly once on both sides, recurse between anchors
+def _patience_matches(a, b, alo, ahi, blo, bhi, matches):
+    while alo < ahi and blo < bhi and a[alo] == b[blo]:
+        matches.append((alo, blo))
+        alo += 1
+        blo += 1
+    suffix = []
+    while alo < ahi and blo < bhi and a[ahi - 1] == b[bhi - 1]:
+        ahi -= 1
+        bhi -= 1
+        suffix.append((ahi, bhi))
+
+    if alo < ahi and blo < bhi:
+        counts_a = Counter(a[alo:ahi])
+        counts_b = Counter(b[blo:bhi])
+        b_position = {b[j]: j for j in range(blo, bhi) if counts_b[b[j]] == 1}
+        anchors = [(i, b_position[a[i]]) for i in range(alo, ahi) if counts_a[a[i]] == 1 and a[i] in b_position]
+        anchors = _longest_increasing(anchors)
+
+        if not anchors:
+            _myers_matches(a, b, alo, ahi, blo, bhi, matches)
+        else:
+            i_prev, j_prev = alo, blo
+            for i, j in anchors:
+                _patience_matches(a, b, i_prev, i, j_prev, j, matches)
+                matches.append((i, j))
+                i_prev, j_prev = i + 1, j + 1
+            _patience_matches(a, b, i_prev, ahi, j_prev, bhi, matches)
+
+    matches.extend(reversed(suffix))
+
+# Turn sorted matching (i, j) pairs into SequenceMatcher-style opcodes
+def _matches_to_opcodes(matches, n, m):
+    opcodes = []
+    i = j = 0
+    index = 0
+    while index < len(matches):
+        mi, mj = matches[index]
+        if i < mi or j < mj:
+            tag = "replace" if i < mi and j < mj else ("delete" if i < mi else "insert")
+            opcodes.append((tag, i, mi, j, mj))
+        size = 1
+        while index + size < len(matches) and matches[index + size] == (mi + size, mj + size):
+            size += 1
+        opcodes.append(("equal", mi, mi + size, mj, mj + size))
+        i, j = mi + size, mj + size
+        index += size
+    if i < n or j < m:
+        tag = "replace" if i < n and j < m else ("delete" if i < n else "insert")
+        opcodes.append((tag, i, n, j, m))
+    return opcodes
+
+def patience_opcodes(a_lines, b_lines):
+    a, b = intern_lines(a_lines, b_lines)
+    matches = []
+    _patience_matches(a, b, 0, len(a), 0, len(b), matches)
+    return _matches_to_opcodes(matches, len(a), len(b))
+
+def myers_opcodes(a_lines, b_lines):
+    a, b = intern_lines(a_lines, b_lines)
+    matches = []
+    _myers_matches(a, b, 0, len(a), 0, len(b), matches)
+    return _matches_to_opcodes(matches, len(a), len(b))
+
+def difflib_opcodes(a_lines, b_lines):
+    return difflib.SequenceMatcher(None, a_lines, b_lines, autojunk=False).get_opcodes()
+
+DIFF_ENGINES = {
+    "patience": patience_opcodes,
+    "myers": myers_opcodes,
+    "difflib": difflib_opcodes,
+}
+
+def diff_opcodes(a_lines, b_lines, engine=None):
+    return DIFF_ENGINES[engine or DIFF_ENGINE](a_lines, b_lines)
+
+# Lines Differ would mark with "+ " (additions) and "- " (deletions)
+def additions_and_deletions(a_lines, b_lines, opcodes=None):
+    if opcodes is None:
+        opcodes = diff_opcodes(a_lines, b_lines)
+    additions = []
+    deletions = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        if tag in ("replace", "delete"):
+            deletions.extend(a_lines[i1:i2])
+        if tag in ("replace", "insert"):
+            additions.extend(b_lines[j1:j2])
+    return additions, deletions
+
+HTML_DIFF_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta http-equiv="Content-Type" content="text/html; charset=utf-8" />
+<style type="text/css">
+    table.diff {{font-family:Courier; border:medium;}}
+    .diff_header {{background-color:#e0e0e0}}
+    td.diff_header {{text-align:right}}
+    .diff_next {{background-color:#c0c0c0}}
+    .diff_add {{background-color:#aaffaa}}
+    .diff_chg {{background-color:#ffff77}}
+    .diff_sub {{background-color:#ffaaaa}}
+</style>
+</head>
+<body>
+<table class="diff" summary="Legends">
+    <tr><th colspan="2"> Legends </th></tr>
+    <tr><td><table border="" summary="Colors">
+        <tr><th> Colors </th></tr>
+        <tr><td class="diff_add">&nbsp;Added&nbsp;</td></tr>
+        <tr><td class="diff_chg">Changed</td></tr>
+        <tr><td class="diff_sub">Deleted</td></tr>
+    </table></td></tr>
+</table>
+<table class="diff" cellspacing="0" cellpadding="0" rules="groups">
+    <colgroup></colgroup> <colgroup></colgroup> <colgroup></colgroup> <colgroup></colgroup>
+    <tbody>
+{rows}
+    </tbody>
+</table>
+</body>
+</html>
+"""
+
+def _highlight_pair(old_line, new_line):
+    # Character-level highlight within one changed line pair
+    old_parts = []
+    new_parts = []
+    matcher = difflib.SequenceMatcher(None, old_line, new_line)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        old_text = html.escape(old_line[i1:i2])
+        new_text = html.escape(new_line[j1:j2])
+        if tag == "equal":
+            old_parts.append(old_text)
+            new_parts.append(new_text)
+        else:
+            if old_text:
+                old_parts.append(f'<span class="diff_chg">{old_text}</span>')
+            if new_text:
+                new_parts.append(f'<span class="diff_chg">{new_text}</span>')
+    return "".join(old_parts), "".join(new_parts)
+
+def _row(old_number, old_html, new_number, new_html):
+    return (f'        <tr><td class="diff_header">{old_number}</td><td nowrap="nowrap">{old_html}</td>'
+            f'<td class="diff_header">{new_number}</td><td nowrap="nowrap">{new_html}</td></tr>')
+
+# Side-by-side HTML diff rendered straight from opcodes (replacement for difflib.HtmlDiff.make_file)
+def render_html_diff(a_lines, b_lines, context=True, numlines=5, opcodes=None):
+    if opcodes is None:
+        opcodes = diff_opcodes(a_lines, b_lines)
+    rows = []
+    last = len(opcodes) - 1
+    for index, (tag, i1, i2, j1, j2) in enumerate(opcodes):
+        if tag == "equal":
+            lines = list(range(i2 - i1))
+            if context and len(lines) > 2 * numlines:
+                head = lines[:numlines] if index > 0 else []
+                tail = lines[-numlines:] if index < last else []
+                for offset in head:
+                    text = html.escape(a_lines[i1 + offset])
+                    rows.append(_row(i1 + offset + 1, text, j1 + offset + 1, text))
+                rows.append('        <tr><td class="diff_next" colspan="4">...</td></tr>')
+                for offset in tail:
+                    text = html.escape(a_lines[i1 + offset])
+                    rows.append(_row(i1 + offset + 1, text, j1 + offset + 1, text))
+                continue
+            for offset in lines:
+                text = html.escape(a_lines[i1 + offset])
+                rows.append(_row(i1 + offset + 1, text, j1 + offset + 1, text))
+        else:
+            for offset in range(max(i2 - i1, j2 - j1)):
+                has_old = i1 + offset < i2
+                has_new = j1 + offset < j2
+                if has_old and has_new:
+                    old_html, new_html = _highlight_pair(a_lines[i1 + offset], b_lines[j1 + offset])
+                elif has_old:
+                    old_html, new_html = f'<span class="diff_sub">{html.escape(a_lines[i1 + offset])}</span>', ""
+                else:
+                    old_html, new_html = "", f'<span class="diff_add">{html.escape(b_lines[j1 + offset])}</span>'
+                rows.append(_row(i1 + offset + 1 if has_old else "", old_html, j1 + offset + 1 if has_new else "", new_html))
+    return HTML_DIFF_TEMPLATE.format(rows="\n".join(rows))
@@ -3,10 +3,7 @@ from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from pathlib import Path
 import pickle
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.embeddings.openai import OpenAIEmbeddings
 from langchain.vectorstores import FAISS
-from langchain.chat_models import ChatOpenAI
 from langchain.chains.question_answering import load_qa_chain
 from langchain.callbacks import get_openai_callback
 import os
@@ -14,35 +11,42 @@ from reportlab.lib.pagesizes import letter
 from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.platypus import SimpleDocTemplate, Paragraph
 import concurrent.futures
+import itertools
 import json
+import re
 import fitz
-import tempfile
-from pptx import Presentation
 from collections import defaultdict
 import time
 import uuid
 import datetime
-from langchain_community.llms import Ollama
+from embedding_cache import get_embedding_cache
+from resources import get_text_embeddings
+from llm_gateway import get_llm, is_timeout_error
+from index_manager import load_embeddings, load_manifest, is_document_indexed, index_document, index_document_batches, compact_index, document_hash, index_version
+from extraction import extract_documents, upload_buffer
+from ingestion import should_stream, stream_pdf_batches
+from chunking import chunk_document
+from retrieval import retrieve_for_questions, similarity_search_batch
+from query_embeddings import constant_questions
+from llm_scheduler import with_request_context, request_context
+from answer_cache import get_answer_cache, llm_model_name, prompt_id, qa_prompt_id
 
 load_dotenv()  # Load environment variables
-text_embeddings = OpenAIEmbeddings()  # Initialize text embeddings
 
 transaction_id = uuid.uuid4()
 
+# Concurrency settings for report generation (overridable through .env)
+MAX_QUESTION_WORKERS = int(os.getenv("OA_MAX_QUESTION_WORKERS", "4"))
+# Time limit for each answer generated in Concurrent mode, from queueing for the LLM to its response
+QUESTION_TIMEOUT_SECONDS = float(os.getenv("OA_QUESTION_TIMEOUT_SECONDS", "120"))
+QUESTION_TIMED_OUT_MESSAGE = "No response before the question timed out."
+
 def get_session_state():
     return st.session_state
 
-# Function to load embeddings from file
-def load_embeddings(application_id, text_embeddings):
-    embeddings_file = f"embeddings/{application_id}_embeddings.pkl"
-    if os.path.exists(embeddings_file):
-        return FAISS.load_local(embeddings_file, embeddings=text_embeddings, allow_dangerous_deserialization=True)
-    return None
-
-# Function to save embeddings to file
-def save_embeddings(application_id, embeddings):
-    embeddings_file = f"embeddings/{application_id}_embeddings.pkl"
-    embeddings.save_local(embeddings_file)
+# Drop the cached answers generated against an earlier version of the application's index
+def invalidate_answers(application_id):
+    get_answer_cache().invalidate(application_id, keep_version=index_version(application_id))
 
 def generate_section_paragraphs(section, questionResponseMap, styles):
     section_paragraphs = []
@@ -115,19 +119,12 @@ def generate_pdf_response(questionResponseMap):
 def read_constant_questions():
     with open("constant/constant.json", "r") as f:
         json_file = json.load(f)
+    return constant_questions(json_file)
 
-    questions = []
-    for section in json_file["data"]:
-        for question in section["questions"]:
-            if isinstance(question, dict):
-                questions += list(question.values())
-            elif isinstance(question, str):
-                questions.append(question)
-
-    return questions
-
-def process_question(question, vectorstore, llm):
-    docs = vectorstore.similarity_search(query=question, k=3)
+# docs are the question's retrieved chunks when they were fetched in a batch beforehand
+def process_question(question, vectorstore, llm, docs=None):
+    if docs is None:
+        docs = similarity_search_batch(vectorstore, [question], k=3)[0]
     chain = load_qa_chain(llm=llm, chain_type="stuff")
     with get_openai_callback() as cb:
         response = chain.run(input_documents=docs, question=question)
@@ -160,37 +157,133 @@ def process_question(question, vectorstore, llm):
     
     return question, response
 
+# Retrieve context for every question, dropping chunks already retrieved for an earlier question
+def collect_batched_context(questions, vectorstore, k=3, retrieved=None):
+    if retrieved is None:
+        retrieved = retrieve_for_questions(vectorstore, questions, k=k)
+    seen = set()
+    context_chunks = []
+    for question in questions:
+        for doc in retrieved[question]:
+            if doc.page_content not in seen:
+                seen.add(doc.page_content)
+                context_chunks.append(doc.page_content)
+    return context_chunks
+
+def build_batched_prompt(questions, context_chunks):
+    context = "\n\n".join(f"[{i + 1}] {chunk}" for i, chunk in enumerate(context_chunks))
+    numbered_questions = "\n".join(f'"q{i + 1}": {question}' for i, question in enumerate(questions))
+    return f"""
+    Use the following pieces of context to answer each question at the end.
+    If you don't know the answer to a question, just say that you don't know, don't try to make up an answer.
+
+    Context:
+    {context}
+
+    Questions:
+    {numbered_questions}
+
+    Return only a JSON object whose keys are the question ids ("q1", "q2", ...) and whose values are the answers as strings.
+    """
+
+# Identifies the batched prompt in the answer cache; changes whenever build_batched_prompt is edited
+BATCHED_PROMPT_ID = prompt_id(build_batched_prompt(["{question}"], ["{context}"]))
+
+def parse_batched_response(content, questions):
+    clean_content = content.strip().replace("```json", "").replace("```", "").strip()
+    json_match = re.search(r"\{.*\}", clean_content, re.DOTALL)
+    if not json_match:
+        return {}
+    try:
+        answers = json.loads(json_match.group(0))
+    except json.JSONDecodeError:
+        return {}
+    if not isinstance(answers, dict):
+        return {}
+
+    questionResponseMap = {}
+    for i, question in enumerate(questions):
+        answer = answers.get(f"q{i + 1}")
+        if isinstance(answer, str) and answer.strip():
+            questionResponseMap[question] = answer
+    return questionResponseMap
+
+# Answer all report questions with a single LLM call over the deduplicated context.
+# Questions missing from the parsed JSON fall back to one process_question call each; a failed fallback
+# is recorded as that question's answer. on_answer is called for every answer that was actually generated.
+def process_questions_batched(questions, vectorstore, llm, k=3, on_answer=None):
+    retrieved = retrieve_for_questions(vectorstore, questions, k=k)
+    context_chunks = collect_batched_context(questions, vectorstore, k=k, retrieved=retrieved)
+    prompt = build_batched_prompt(questions, context_chunks)
+    try:
+        content = llm.predict(prompt)
+        questionResponseMap = parse_batched_response(content, questions)
+    except Exception as e:
+        print(f"Batched report generation failed: {e}")
+        questionResponseMap = {}
+
+    for question in questions:
+        if question not in questionResponseMap:
+            try:
+                _, questionResponseMap[question] = process_question(question, vectorstore, llm, retrieved[question])
+            except Exception as e:
+                questionResponseMap[question] = f"Error generating response: {e}"
+                continue
+        if on_answer is not None:
+            on_answer(question, questionResponseMap[question])
+    return questionResponseMap
+
+# Answer the report questions on a bounded worker pool and yield (question, response) as each one finishes.
+# Context for every question is retrieved up front in one batch. Worker threads never touch Streamlit;
+# the caller renders results on the script thread. on_answer(question, response) is called for every
+# answer that was actually generated (not for errors or timeouts). Each question has timeout seconds from
+# when a worker picks it up: its LLM requests stop queueing, retrying and waiting on the network at that
+# deadline, and a question still running past it is reported as timed out and its result dropped.
+def answer_questions_concurrently(questions, vectorstore, llm, max_workers=MAX_QUESTION_WORKERS, on_answer=None,
+                                  timeout=QUESTION_TIMEOUT_SECONDS):
+    retrieved = retrieve_for_questions(vectorstore, questions)
+    deadlines = {}
+
+    def run(question):
+        deadlines[question] = time.monotonic() + timeout
+        with request_context(deadline=deadlines[question]):
+            return process_question(question, vectorstore, llm, retrieved[question])
+
+    executor = ThreadPoolExecutor(max_workers=max(1, max_workers))
+    pending = {executor.submit(with_request_context(run), question): question for question in questions}
+    try:
+        while pending:
+            # A question that has not started yet cannot reach its deadline sooner than timeout from now
+            now = time.monotonic()
+            next_deadline = min([deadlines[q] for q in pending.values() if q in deadlines] + [now + timeout])
+            done, _ = concurrent.futures.wait(pending, timeout=max(0.0, next_deadline - now),
+                                              return_when=concurrent.futures.FIRST_COMPLETED)
+            now = time.monotonic()
+            expired = [f for f in pending if f not in done and pending[f] in deadlines and deadlines[pending[f]] <= now]
+            for future in expired:
+                yield pending.pop(future), QUESTION_TIMED_OUT_MESSAGE
+            for future in done:
+                question = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    if is_timeout_error(e):
+                        yield question, QUESTION_TIMED_OUT_MESSAGE
+                    else:
+                        yield question, f"Error generating response: {e}"
+                    continue
+                if on_answer is not None:
+                    on_answer(*result)
+                yield result
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
 # Function to extract text from different document types
 def extract_text_from_file(file):
-    if file.type == "application/pdf":
-        with tempfile.NamedTemporaryFile(delete=False) as tmp_file:
-            tmp_file.write(file.getvalue())
-            tmp_file_path = tmp_file.name
-
-        pdf_document = fitz.open(tmp_file_path)
-        all_text = ""
-        for page in pdf_document:
-            all_text += page.get_text("text")
-        return all_text
-    elif file.type == "application/vnd.openxmlformats-officedocument.presentationml.presentation":
-        presentation = Presentation(file)
-        all_text = ""
-        for slide in presentation.slides:
-            for shape in slide.shapes:
-                if hasattr(shape, "text"):
-                    all_text += shape.text
-        return all_text
-    elif file.type == "application/msword" or file.type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
-        from docx import Document
-        doc = Document(file)
-        all_text = ""
-        for para in doc.paragraphs:
-            all_text += para.text
-        return all_text
-    elif file.type == "text/plain":
-        return file.read().decode("utf-8")
-    else:
-        return ""
+    extracted = extract_documents([file], "index")[0]
+    if extracted.error:
+        raise Exception(extracted.error)
+    return extracted.text
 
 def doc_generator_page():
     st.header("OA Generator 📚")
@@ -201,6 +294,7 @@ def doc_generator_page():
 
     application_id = st.session_state.application_id
     st.text(f"Application ID: {application_id}")
+    text_embeddings = get_text_embeddings()
 
     with open("constant\\database.json", "r") as f:
         database = json.load(f)
@@ -244,62 +338,128 @@ def doc_generator_page():
         )
 
     if documents:
-        all_text = ""
         st.session_state.doc_generator_page_documents = documents
+        indexed_any = False
+
+        # Skip uploads whose content is already in the index before doing any extraction
+        manifest = load_manifest(application_id)
+        new_documents = []
         for doc in documents:
-            database[application_id]["doc_list"].append({
-                "doc_name": os.path.basename(doc.name),
-                "time_uploaded": datetime.datetime.now().strftime("%m/%d/%Y, %H:%M:%S")
-            })
+            doc_hash = document_hash(upload_buffer(doc))
+            if is_document_indexed(manifest, doc_hash):
+                st.info(f"{doc.name} is already indexed for this Application ID.")
+            else:
+                new_documents.append((doc, doc_hash))
 
-            with open("constant\\database.json", "w") as f:
-                json.dump(database, f, indent=4)
+        # Very large PDFs are streamed page by page; everything else is extracted in parallel
+        # Keyed by content hash, since two uploads can share a file name
+        streamed = {doc_hash for doc, doc_hash in new_documents if should_stream(doc.type, upload_buffer(doc))}
+        pooled = [(doc, doc_hash) for doc, doc_hash in new_documents if doc_hash not in streamed]
+        extracted_documents = dict(zip([doc_hash for _, doc_hash in pooled], extract_documents([doc for doc, _ in pooled], "index")))
 
-        for doc in documents:
+        for doc, doc_hash in new_documents:
+            doc_name = os.path.basename(doc.name)
             try:
-                file_content = extract_text_from_file(doc)
-                if file_content.strip():
-                    all_text += file_content
-                    st.success(f"Text extracted successfully from {doc.name}")
+                if doc_hash in streamed:
+                    progress_text = st.empty()
+                    batches = stream_pdf_batches(upload_buffer(doc))
+                    on_batch = lambda count: progress_text.write(f"Indexed {count} chunks from {doc.name}...")
+                    vectorstore, status, chunk_count = index_document_batches(application_id, vectorstore, doc_name, doc_hash, batches, text_embeddings, on_batch)
+                    if not chunk_count:
+                        st.warning(f"No readable text found in {doc.name}.")
+                        continue
                 else:
-                    st.warning(f"No readable text found in {doc.name}.")
+                    extracted = extracted_documents[doc_hash]
+                    if extracted.error:
+                        raise Exception(extracted.error)
+                    file_content = extracted.text
+                    if not file_content.strip():
+                        st.warning(f"No readable text found in {doc.name}.")
+                        continue
+                    st.success(f"Text extracted successfully from {doc.name}")
+
+                    # Chunk each document (page by page for PDFs) so its chunks can be tracked and replaced
+                    chunks, metadatas = chunk_document(extracted.structure, file_content)
+                    vectorstore, status = index_document(application_id, vectorstore, doc_name, doc_hash, chunks, text_embeddings, metadatas)
+                    chunk_count = len(chunks)
             except Exception as e:
                 st.error(f"Error processing {doc.name}: {e}")
+                continue
 
-        if all_text:
-            # Split concatenated text into chunks
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=1000,
-                chunk_overlap=200,
-                length_function=len
-            )
-            chunks = text_splitter.split_text(text=all_text)
-
-            if vectorstore is None:
-                st.write("Creating new embeddings...")
-                vectorstore = FAISS.from_texts(chunks, embedding=text_embeddings)
-            else:
-                st.write("Appending to existing embeddings...")
-                vectorstore.add_texts(chunks)
+            if status == "skipped":
+                st.info(f"{doc.name} is already indexed for this Application ID.")
+                continue
+            st.write(f"{'Replaced' if status == 'replaced' else 'Added'} {chunk_count} chunks from {doc.name}.")
+            indexed_any = True
 
-            save_embeddings(application_id, vectorstore)
+            database[application_id]["doc_list"].append({
+                "doc_name": doc_name,
+                "time_uploaded": datetime.datetime.now().strftime("%m/%d/%Y, %H:%M:%S")
+            })
+            with open("constant\\database.json", "w") as f:
+                json.dump(database, f, indent=4)
+
+        if indexed_any:
+            # Segments are already on disk; only rewrite the full index once there are many of them
+            # or the corpus size calls for a different index type
+            compact_index(application_id, vectorstore)
             st.session_state.vectorstore = vectorstore
             st.session_state.openai_embeddings = text_embeddings
+            invalidate_answers(application_id)
             st.success("Embeddings updated and saved successfully.")
-        else:
+            cache_stats = get_embedding_cache().stats()
+            st.caption(f"Embedding cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+                       f"({cache_stats['hit_rate']:.0%} hit rate, {cache_stats['entries']} cached chunks)")
+        elif vectorstore is None:
             st.warning("No text could be extracted from the uploaded documents. Please check the files.")
 
     if vectorstore:
         # Generate responses
         questions = read_constant_questions()
-        llm = ChatOpenAI() if model_choice == "GPT-4o" else Ollama(model="llama3")
-        questionResponseMap = {}
-
+        generation_mode = st.radio("Generation mode", ["Concurrent", "Batched"], horizontal=True)
+        # Each concurrent question is one request bounded by the question timeout; the single batched
+        # request answers every question at once and keeps the gateway's longer default
+        llm = get_llm(model_choice, timeout=QUESTION_TIMEOUT_SECONDS if generation_mode == "Concurrent" else None)
+        max_workers = MAX_QUESTION_WORKERS
+        if generation_mode == "Concurrent":
+            max_workers = st.number_input("Parallel questions", min_value=1, max_value=16, value=MAX_QUESTION_WORKERS)
+
+        # One placeholder per question so answers appear in section order as they finish
+        placeholders = {}
         for question in questions:
-            _, response = process_question(question, vectorstore, llm)
-            questionResponseMap[question] = response
-            st.subheader(f"Question: {question}")
-            st.write(f"Answer: {response}")
+            placeholders[question] = st.empty()
+            placeholders[question].info(f"Question: {question}\n\nGenerating answer...")
+
+        # Answers generated before against this index version, model and prompt are reused without an LLM call
+        answer_cache = get_answer_cache()
+        cache_key = (application_id, index_version(application_id), llm_model_name(llm),
+                     BATCHED_PROMPT_ID if generation_mode == "Batched" else qa_prompt_id(llm))
+        cached = answer_cache.get_many(*cache_key, questions)
+        missing = [question for question in questions if question not in cached]
+
+        answers = list(cached.items())
+        store = lambda question, response: answer_cache.put_many(*cache_key, {question: response})
+        if missing and generation_mode == "Batched":
+            with st.spinner("Generating all answers in one request..."):
+                answers += process_questions_batched(missing, vectorstore, llm, on_answer=store).items()
+        elif missing:
+            answers = itertools.chain(answers, answer_questions_concurrently(missing, vectorstore, llm, max_workers=int(max_workers), on_answer=store))
+
+        responses = {}
+        progress = st.progress(0)
+        for question, response in answers:
+            responses[question] = response
+            with placeholders[question].container():
+                st.subheader(f"Question: {question}")
+                st.write(f"Answer: {response}")
+            progress.progress(len(responses) / len(questions))
+
+        answer_stats = answer_cache.stats()
+        st.caption(f"Answer cache: {len(cached)} of {len(questions)} answers reused "
+                   f"({answer_stats['hits']} hits, {answer_stats['misses']} misses, {answer_stats['hit_rate']:.0%} hit rate)")
+
+        # Keep the constant.json order for the PDF report
+        questionResponseMap = {question: responses[question] for question in questions}
 
         # Generate PDF report
         generate_pdf_response(questionResponseMap)
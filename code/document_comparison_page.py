@@ -1,7 +1,4 @@
-import difflib
-import openai
 import streamlit as st
-import tempfile
 import fitz
 from docx import Document
 import os
@@ -9,8 +6,6 @@ import re
 import json
 import zipfile
 import requests
-import ollama
-from openai import OpenAI
 from reportlab.platypus import SimpleDocTemplate, Paragraph, PageTemplate, Frame, PageBreak, PageTemplate, Spacer
 from reportlab.lib.pagesizes import letter
 from reportlab.lib import colors
@@ -20,39 +15,16 @@ from datetime import datetime
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.pdfbase import pdfmetrics
 from reportlab.platypus import Image
-
-pdfmetrics.registerFont(TTFont('ArabicFont', "assets/ArabicFont/NotoKufiArabic-Regular.ttf"))
-
-# Preprocessing text to standardize for comparison
-def preprocess_text(text):
-    return "\n".join([line.strip() for line in text.splitlines() if line.strip()])
-
-# Extract text from Word documents, including tables
-def extract_text_from_docx(doc):
-    full_text = []
-    for paragraph in doc.paragraphs:
-        full_text.append(paragraph.text)
-    for table in doc.tables:
-        for row in table.rows:
-            row_text = [cell.text for cell in row.cells]
-            full_text.append("\t".join(row_text))
-    return "\n".join(full_text)
-
-# Extract text from PDFs, including structured content
-def extract_text_from_pdf(pdf_path):
-    doc = fitz.open(pdf_path)
-    full_text = []
-    for page in doc:
-        full_text.append(page.get_text("text"))
-        for block in page.get_text("blocks") or []:
-            if block[-1] == 0:
-                full_text.append(block[4])
-    return "\n".join(full_text)
+from resources import register_arabic_font
+from arabic_translation import translate_memo_sections, CONTENT_NOT_AVAILABLE
+from translation_memory import get_translation_memory
+from llm_gateway import chat, ollama_generate
+from comparison import compare_documents, content_hash
+from extraction import extract_documents, upload_buffer
 
 # Generate HTML diff to display changes and common parts
 def generate_html_diff(doc1_text, doc2_text):
-    differ = difflib.HtmlDiff()
-    html_diff = differ.make_file(doc1_text.splitlines(), doc2_text.splitlines(), context=True, numlines=1000)
+    html_diff = compare_documents(doc1_text, doc2_text).html_diff(context=True, numlines=1000)
     return html_diff
 
 def process_points(content):
@@ -265,7 +237,7 @@ def generate_templated_pdf(memo_content, template_path="constant/template.json")
 
 def generate_arabic_pdf(memo_content, template_path="constant/template.json"):
     # Load the template JSON
-    pdfmetrics.registerFont(TTFont('ArabicFont', "assets/ArabicFont/NotoKufiArabic-Regular.ttf"))
+    register_arabic_font()
     with open(template_path, "r") as f:
         template = json.load(f)
 
@@ -283,36 +255,31 @@ def generate_arabic_pdf(memo_content, template_path="constant/template.json"):
 
     elements = []
 
+    # Translate all titles and bodies up front instead of one request at a time
+    translated_titles, translated_contents = translate_memo_sections(memo_content, template)
+
     for section in template["template"]["sections"]:
         content_key = section.get("content_key", None)
 
         if content_key:
-            content = memo_content.get(content_key, "المحتوى غير متوفر.")
-            translated_content = translate_to_arabic(content)
-            translated_content = translated_content.encode("utf-8").decode("utf-8")
+            translated_content = translated_contents.get(content_key, CONTENT_NOT_AVAILABLE)
             if section["title"] != "Summary of Changes":
-                translated_title = translate_to_arabic(section["title"])
-                elements.append(Paragraph(translated_title, style_section))
+                elements.append(Paragraph(translated_titles[content_key], style_section))
             points = process_points_arabic(translated_content)
             elements.extend(points)
-            #elements.append(Paragraph(translated_content, style_body))
 
         if "subsections" in section:
             for subsection in section["subsections"]:
                 sub_content_key = subsection.get("content_key", None)
 
                 if sub_content_key:
-                    sub_content = memo_content.get(sub_content_key, "المحتوى غير متوفر.")
-                    translated_sub_content = translate_to_arabic(sub_content)
-                    translated_subtitle = translate_to_arabic(subsection["title"])
-                    elements.append(Paragraph(translated_subtitle, style_section))
-                    points = process_points_arabic(translated_content)
+                    translated_sub_content = translated_contents.get(sub_content_key, CONTENT_NOT_AVAILABLE)
+                    elements.append(Paragraph(translated_titles[sub_content_key], style_section))
+                    points = process_points_arabic(translated_sub_content)
                     elements.extend(points)
-                    #elements.append(Paragraph(translated_sub_content, style_body))
                 else:
-                    translated_subtitle = translate_to_arabic(subsection["title"])
-                    elements.append(Paragraph(translated_subtitle, style_section))
-                    elements.append(Paragraph("المحتوى غير متوفر.", style_body))
+                    elements.append(Paragraph(translated_titles[subsection["title"]], style_section))
+                    elements.append(Paragraph(CONTENT_NOT_AVAILABLE, style_body))
 
     elements.append(PageBreak())
     # Header/Footer function
@@ -377,11 +344,8 @@ def generate_arabic_pdf(memo_content, template_path="constant/template.json"):
     print("Arabic PDF generation completed successfully.")
 
 def generate_gpt4_memo(doc1_text, doc2_text, responsibilties_selected, stakeholders_context):
-    differ = difflib.Differ()
-    diff = list(differ.compare(doc1_text.splitlines(), doc2_text.splitlines()))
-    
-    additions = [line[2:] for line in diff if line.startswith("+ ")]
-    deletions = [line[2:] for line in diff if line.startswith("- ")]
+    comparison = compare_documents(doc1_text, doc2_text)  # Reuses the diff already computed for the viewer
+    additions, deletions = comparison.additions, comparison.deletions
 
     responsibilities_string = ""   #To add in the **Responsibilties** line in prompt
     keys_string = ""   #To add in the JSON format keys
@@ -425,8 +389,7 @@ def generate_gpt4_memo(doc1_text, doc2_text, responsibilties_selected, stakehold
     """
     print("Prompt", prompt)
     try:
-        openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        completion = openai_client.chat.completions.create(
+        content = chat(
             model="gpt-4o",
             messages=[
                 {"role": "system", "content": "You are a helpful assistant for generating structured operational advice memos based on document changes."},
@@ -435,7 +398,6 @@ def generate_gpt4_memo(doc1_text, doc2_text, responsibilties_selected, stakehold
             max_tokens=10000,
             temperature=0.7,
         )
-        content = completion.choices[0].message.content
         print("Content", content)
         clean_content = content.strip().replace("```json", "").replace("```", "").strip()
         try:
@@ -452,11 +414,8 @@ def generate_gpt4_memo(doc1_text, doc2_text, responsibilties_selected, stakehold
         raise
 
 def generate_deepseek_memo(doc1_text, doc2_text, responsibilties_selected, stakeholders_context):
-    differ = difflib.Differ()
-    diff = list(differ.compare(doc1_text.splitlines(), doc2_text.splitlines()))
-    
-    additions = [line[2:] for line in diff if line.startswith("+ ")]
-    deletions = [line[2:] for line in diff if line.startswith("- ")]
+    comparison = compare_documents(doc1_text, doc2_text)  # Reuses the diff already computed for the viewer
+    additions, deletions = comparison.additions, comparison.deletions
 
     responsibilities_string = ""   # To add in the **Responsibilities** line in prompt
     keys_string = ""   # To add in the JSON format keys
@@ -500,7 +459,7 @@ def generate_deepseek_memo(doc1_text, doc2_text, responsibilties_selected, stake
     print("Prompt:", prompt)
 
     try:
-        response = ollama.generate(
+        response = ollama_generate(
             model="deepseek-r1:7b",
             prompt=prompt,
             system="You are a helpful assistant for generating structured operational advice memos based on document changes.",
@@ -550,34 +509,6 @@ def extract_json(text):
                 continue
     return None
 
-def translate_to_arabic(text):
-    openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-    def translate_single_item(item):
-        try:
-            response = openai_client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {"role": "system", "content": "You are a helpful translator. Translate the following text to Arabic."},
-                    {"role": "user", "content": str(item)}
-                ]
-            )
-            return response.choices[0].message.content
-        except Exception as e:
-            print(f"Error during translation: {e}")
-            return item  # Return the original item if translation fails
-
-    # Handle different input types
-    if isinstance(text, str):
-        return translate_single_item(text)
-    elif isinstance(text, list):
-        return [translate_single_item(item) for item in text]
-    elif isinstance(text, dict):
-        return {key: translate_single_item(value) for key, value in text.items()}
-    else:
-        print(f"Unsupported input type: {type(text)}")
-        return text
-
 # Main Streamlit application logic
 def document_comparison_page():
     st.header("Enhanced Document Comparison and Operational Advice Memo 📝")
@@ -593,28 +524,23 @@ def document_comparison_page():
 
     all_texts = []
     doc_names = []
-    for doc in documents:
-        try:
-            if doc.type == "application/pdf":
-                with tempfile.NamedTemporaryFile(delete=False) as tmp_file:
-                    tmp_file.write(doc.getvalue())
-                    tmp_file_path = tmp_file.name
-                all_texts.append(preprocess_text(extract_text_from_pdf(tmp_file_path)))
-                doc_names.append(doc.name)
-
-            elif doc.type in ["application/vnd.openxmlformats-officedocument.wordprocessingml.document", "application/msword"]:
-                docx = Document(doc)
-                all_texts.append(preprocess_text(extract_text_from_docx(docx)))
-                doc_names.append(doc.name)
-
-            elif doc.type == "text/plain":
-                all_texts.append(preprocess_text(doc.read().decode("utf-8")))
-                doc_names.append(doc.name)
+    # Extracted texts survive Streamlit reruns, keyed by file name and content hash
+    extracted_texts = st.session_state.setdefault("comparison_extracted_texts", {})
+    cache_keys = [(doc.name, content_hash(upload_buffer(doc))) for doc in documents]
+    pending = [(doc, cache_key) for doc, cache_key in zip(documents, cache_keys) if cache_key not in extracted_texts]
+    extracted_documents = extract_documents([doc for doc, _ in pending], "comparison")
+    for (doc, cache_key), extracted in zip(pending, extracted_documents):
+        if extracted.error:
+            st.warning(f"Error processing {doc.name}: {extracted.error}")
+        elif extracted.text is None:
+            st.warning(f"Unsupported file type: {doc.type}")
+        else:
+            extracted_texts[cache_key] = extracted.text
 
-            else:
-                st.warning(f"Unsupported file type: {doc.type}")
-        except Exception as e:
-            st.warning(f"Error processing {doc.name}: {e}")
+    for doc, cache_key in zip(documents, cache_keys):
+        if cache_key in extracted_texts:
+            all_texts.append(extracted_texts[cache_key])
+            doc_names.append(doc.name)
 
     if len(all_texts) < 2:
         st.warning("Please upload at least two valid documents.")
@@ -673,6 +599,9 @@ def document_comparison_page():
                     # Generate the PDFs using your custom function
                     generate_templated_pdf(memo_content)
                     generate_arabic_pdf(memo_content)
+                    translation_stats = get_translation_memory().stats()
+                    st.caption(f"Translation memory: {translation_stats['hits']} hits, {translation_stats['misses']} misses "
+                               f"({translation_stats['hit_rate']:.0%} hit rate, {translation_stats['entries']} stored translations)")
                     #generate_templated_pdf(memo_content)  # Pass memo_content here
                     st.success("Memo PDF generated successfully!")
                 except Exception as e:
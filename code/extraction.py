@@ -0,0 +1,218 @@
+import os
+import io
+import multiprocessing
+from collections import namedtuple
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+EXTRACTION_WORKERS = int(os.getenv("OA_EXTRACTION_WORKERS", str(os.cpu_count() or 2)))
+
+PDF_TYPE = "application/pdf"
+DOCX_TYPES = ("application/vnd.openxmlformats-officedocument.wordprocessingml.document", "application/msword")
+PPTX_TYPE = "application/vnd.openxmlformats-officedocument.presentationml.presentation"
+TEXT_TYPE = "text/plain"
+
+# Bump whenever extract_raw's output changes so cached extractions are not reused
+EXTRACTOR_VERSION = "2"
+
+# text is None when the file type is not supported by the page; error holds the message of a failed extraction.
+# structure is the raw extraction the text was rendered from (see extract_raw).
+ExtractedDocument = namedtuple("ExtractedDocument", ["name", "text", "error", "structure"], defaults=(None,))
+
+# Preprocessing text to standardize for comparison
+def preprocess_text(text):
+    return "\n".join([line.strip() for line in text.splitlines() if line.strip()])
+
+# Zero-copy view of an uploaded file's contents, for hashing without duplicating the upload
+def upload_buffer(file):
+    if hasattr(file, "getbuffer"):
+        return file.getbuffer()
+    return file.getvalue()
+
+# Open a PDF straight from memory; accepts the raw bytes, an upload_buffer() view or, for existing callers, a file path
+def open_pdf(pdf):
+    import fitz
+    if isinstance(pdf, (bytes, bytearray, memoryview)):
+        return fitz.open(stream=pdf, filetype="pdf")
+    return fitz.open(pdf)
+
+# Single pass over a PDF page: read the layout dict once and keep every text block with its page,
+# bounding box and largest font size. The page text is built from the same blocks.
+def pdf_page_blocks(page):
+    import fitz
+    page_blocks = []
+    for block in page.get_text("dict", flags=fitz.TEXTFLAGS_TEXT)["blocks"]:
+        if block.get("type", 0) != 0:
+            continue
+        lines = ["".join(span["text"] for span in line["spans"]) for line in block["lines"]]
+        text = "\n".join(lines).strip()
+        if not text:
+            continue
+        sizes = [span["size"] for line in block["lines"] for span in line["spans"] if span["text"].strip()]
+        page_blocks.append({
+            "page": page.number + 1,
+            "bbox": [round(value, 2) for value in block["bbox"]],
+            "size": round(max(sizes), 2) if sizes else 0,
+            "text": text,
+        })
+    return page_blocks
+
+def pdf_page_text(page_blocks):
+    return "\n".join(block["text"] for block in page_blocks)
+
+def extract_pdf_pages(pdf):
+    pages = []
+    blocks = []
+    with open_pdf(pdf) as doc:
+        for page in doc:
+            page_blocks = pdf_page_blocks(page)
+            blocks.append(page_blocks)
+            pages.append(pdf_page_text(page_blocks))
+    return pages, blocks
+
+# Extract text from PDFs
+def extract_text_from_pdf(pdf):
+    pages, _ = extract_pdf_pages(pdf)
+    return "\n".join(pages)
+
+def render_pdf_text(raw):
+    return "\n".join(raw["pages"])
+
+# Blocks set in a noticeably larger font than the body text of the document, in reading order
+def detect_headings(raw, min_ratio=1.15, max_length=120):
+    blocks = [block for page_blocks in raw["blocks"] for block in page_blocks]
+    sizes = sorted(block["size"] for block in blocks if block["size"])
+    if not sizes:
+        return []
+    body_size = sizes[len(sizes) // 2]
+    return [block for block in blocks
+            if block["size"] >= body_size * min_ratio and len(block["text"]) <= max_length]
+
+# Extract text from Word documents, including tables
+def extract_text_from_docx(doc, include_tables=True):
+    return render_docx_text(extract_docx_parts(doc), include_tables)
+
+def extract_docx_parts(doc):
+    paragraphs = [paragraph.text for paragraph in doc.paragraphs]
+    tables = []
+    for table in doc.tables:
+        for row in table.rows:
+            row_text = [cell.text for cell in row.cells]
+            tables.append("\t".join(row_text))
+    return {"paragraphs": paragraphs, "tables": tables}
+
+def render_docx_text(raw, include_tables=True):
+    return "\n".join(raw["paragraphs"] + (raw["tables"] if include_tables else []))
+
+def extract_text_from_pptx(presentation):
+    full_text = []
+    for slide in presentation.slides:
+        for shape in slide.shapes:
+            if hasattr(shape, "text"):
+                full_text.append(shape.text)
+    return "\n".join(full_text)
+
+# Everything the pages need from one file, extracted once and shared by every extraction profile.
+# Returns None for unsupported file types.
+def extract_raw(mime_type, data):
+    if mime_type == PDF_TYPE:
+        pages, blocks = extract_pdf_pages(data)
+        return {"kind": "pdf", "pages": pages, "blocks": blocks}
+    elif mime_type == PPTX_TYPE:
+        from pptx import Presentation
+        return {"kind": "pptx", "text": extract_text_from_pptx(Presentation(io.BytesIO(data)))}
+    elif mime_type in DOCX_TYPES:
+        from docx import Document
+        return {"kind": "docx", **extract_docx_parts(Document(io.BytesIO(data)))}
+    elif mime_type == TEXT_TYPE:
+        return {"kind": "text", "text": data.decode("utf-8")}
+    return None
+
+# Each extraction profile renders a page's text from the raw extraction; None means the type is not supported
+
+# OA Generator: raw text of PDF, PPTX, Word and text files, "" for anything else
+def render_for_index(raw):
+    if raw is None:
+        return ""
+    elif raw["kind"] == "pdf":
+        return render_pdf_text(raw)
+    elif raw["kind"] == "docx":
+        return render_docx_text(raw, include_tables=False)
+    return raw["text"]
+
+# Document comparison pages: preprocessed text including Word tables
+def render_for_comparison(raw):
+    if raw is None or raw["kind"] == "pptx":
+        return None
+    elif raw["kind"] == "pdf":
+        return preprocess_text(render_pdf_text(raw))
+    elif raw["kind"] == "docx":
+        return preprocess_text(render_docx_text(raw))
+    return preprocess_text(raw["text"])
+
+# Procedure manual page: preprocessed text including Word tables
+def render_for_procedure_manual(raw):
+    if raw is None or raw["kind"] == "pptx":
+        return None
+    elif raw["kind"] == "pdf":
+        return preprocess_text(render_pdf_text(raw))
+    elif raw["kind"] == "docx":
+        return preprocess_text(render_docx_text(raw))
+    return preprocess_text(raw["text"])
+
+EXTRACTORS = {
+    "index": render_for_index,
+    "comparison": render_for_comparison,
+    "procedure_manual": render_for_procedure_manual,
+}
+
+# Runs in a worker process, so it only receives plain, picklable arguments.
+# Returns (raw, error).
+def extract_one(mime_type, data):
+    try:
+        return extract_raw(mime_type, data), None
+    except Exception as e:
+        return None, str(e)
+
+# Workers are spawned rather than forked: forking Streamlit's multi-threaded server can copy a lock held by
+# another thread into the child and deadlock it
+@lru_cache(maxsize=None)
+def get_extraction_pool():
+    return ProcessPoolExecutor(max_workers=max(1, EXTRACTION_WORKERS), mp_context=multiprocessing.get_context("spawn"))
+
+def _extract_uncached(jobs):
+    if len(jobs) <= 1 or EXTRACTION_WORKERS <= 1:
+        return [extract_one(*job) for job in jobs]
+    try:
+        return list(get_extraction_pool().map(extract_one, *zip(*jobs)))
+    except BrokenProcessPool:
+        # A crashed worker takes the pool down; start a fresh one next time and finish serially
+        get_extraction_pool.cache_clear()
+        return [extract_one(*job) for job in jobs]
+
+# Extract uploaded files and return ExtractedDocuments in upload order. Files already in the extraction
+# cache cost a hash and a lookup; the rest are extracted on the process pool and then cached.
+def extract_documents(documents, profile):
+    from extraction_cache import get_extraction_cache, extraction_cache_key
+    cache = get_extraction_cache()
+    keys = [extraction_cache_key(upload_buffer(doc)) for doc in documents]
+    cached = cache.get_many(keys)
+
+    jobs = [(doc.type, doc.getvalue()) for doc, key in zip(documents, keys) if key not in cached]
+    extracted = iter(_extract_uncached(jobs))
+
+    results = []
+    for doc, key in zip(documents, keys):
+        if key in cached:
+            raw, error = cached[key], None
+        else:
+            raw, error = next(extracted)
+            if raw is not None:
+                cache.put(key, raw)
+                cached[key] = raw  # Same file uploaded twice in one batch
+        if error:
+            results.append(ExtractedDocument(doc.name, None, error))
+        else:
+            results.append(ExtractedDocument(doc.name, EXTRACTORS[profile](raw), None, raw))
+    return results
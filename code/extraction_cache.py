@@ -0,0 +1,98 @@
+import os
+import json
+import sqlite3
+import hashlib
+import threading
+import time
+from extraction import EXTRACTOR_VERSION
+
+EXTRACTION_CACHE_PATH = os.getenv("OA_EXTRACTION_CACHE_PATH", "embeddings/extraction_cache.sqlite")
+EXTRACTION_CACHE_MAX_MB = float(os.getenv("OA_EXTRACTION_CACHE_MAX_MB", "512"))
+
+# File content hash plus the extractor version, shared by every extraction profile
+def extraction_cache_key(data):
+    digest = hashlib.sha256(data).hexdigest()
+    return f"{digest}:{EXTRACTOR_VERSION}"
+
+class ExtractionCache:
+    """On-disk cache of raw extractions (text plus page/block structure), evicting least-recently-used entries above max_mb."""
+
+    def __init__(self, path=EXTRACTION_CACHE_PATH, max_mb=EXTRACTION_CACHE_MAX_MB):
+        self.path = path
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS extractions ("
+            "key TEXT PRIMARY KEY, structure TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS extractions_last_used ON extractions (last_used)")
+        self._conn.commit()
+
+    # Returns {key: raw extraction} for the keys that are cached
+    def get_many(self, keys):
+        found = {}
+        with self._lock:
+            for key in set(keys):
+                row = self._conn.execute("SELECT structure FROM extractions WHERE key = ?", (key,)).fetchone()
+                if row:
+                    found[key] = json.loads(row[0])
+            if found:
+                now = time.time()
+                self._conn.executemany("UPDATE extractions SET last_used = ? WHERE key = ?", [(now, key) for key in found])
+                self._conn.commit()
+            self.hits += sum(1 for key in keys if key in found)
+            self.misses += sum(1 for key in keys if key not in found)
+        return found
+
+    def put(self, key, structure):
+        structure_json = json.dumps(structure)
+        size = len(structure_json)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO extractions (key, structure, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, structure_json, size, time.time())
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM extractions").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute("SELECT key, size FROM extractions ORDER BY last_used").fetchall()
+        evicted = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM extractions WHERE key = ?", evicted)
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM extractions").fetchone()
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": entries,
+            "size_mb": size / (1024 * 1024),
+        }
+
+_extraction_cache = None
+_extraction_cache_lock = threading.Lock()
+
+# Process-wide cache shared by the OA Generator, comparison and procedure manual pages
+def get_extraction_cache():
+    global _extraction_cache
+    with _extraction_cache_lock:
+        if _extraction_cache is None:
+            _extraction_cache = ExtractionCache()
+        return _extraction_cache
@@ -0,0 +1,105 @@
+# Local stand-in for the OpenAI chat completions API with its own RPM/TPM limits, for exercising the LLM
+# scheduler without an API key. Like the real API, the limits replenish continuously and over-limit
+# requests get a 429 with retry-after-ms.
+# Usage (from the repository root): python code/fake_openai_server.py [port] [rpm] [tpm] [latency_seconds]
+# then run the app with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1 and any OPENAI_API_KEY.
+import sys
+import json
+import time
+import uuid
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from llm_scheduler import TokenBucket, estimate_request_tokens
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port=0, rpm=60, tpm=20000, latency=0.2):
+        super().__init__(("127.0.0.1", port), FakeOpenAIHandler)
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.latency = latency
+        self.accepted = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_port}/v1"
+
+    # Seconds until a request of this size would be within the limits, 0 if it is accepted now
+    def admit(self, tokens):
+        with self.lock:
+            now = time.monotonic()
+            wait = max(self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+            if wait > 0:
+                self.rejected += 1
+                return wait
+            self.requests.take(1, now)
+            self.tokens.take(tokens, now)
+            self.accepted += 1
+            return 0.0
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type="application/json", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if not self.path.endswith("/chat/completions"):
+            self._send(404, json.dumps({"error": {"message": f"Unknown path {self.path}"}}).encode())
+            return
+        retry_after = self.server.admit(estimate_request_tokens(body))
+        if retry_after:
+            error = {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}}
+            self._send(429, json.dumps(error).encode(), headers={"retry-after-ms": str(int(retry_after * 1000))})
+            return
+
+        time.sleep(self.server.latency)
+        request = json.loads(body)
+        content = f"Fake answer to: {request['messages'][-1]['content'][:80]}"
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        if request.get("stream"):
+            words = content.split(" ")
+            events = []
+            for i, word in enumerate(words):
+                delta = {"role": "assistant", "content": word} if i == 0 else {"content": " " + word}
+                events.append({"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                               "model": request["model"], "choices": [{"index": 0, "delta": delta, "finish_reason": None}]})
+            events.append({"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                           "model": request["model"], "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+            stream = "".join(f"data: {json.dumps(event)}\n\n" for event in events) + "data: [DONE]\n\n"
+            self._send(200, stream.encode(), content_type="text/event-stream")
+            return
+
+        response = {
+            "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": request["model"],
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": len(body) // 4, "completion_tokens": len(content) // 4,
+                      "total_tokens": (len(body) + len(content)) // 4},
+        }
+        self._send(200, json.dumps(response).encode())
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    rpm = int(sys.argv[2]) if len(sys.argv) > 2 else 60
+    tpm = int(sys.argv[3]) if len(sys.argv) > 3 else 20000
+    latency = float(sys.argv[4]) if len(sys.argv) > 4 else 0.2
+    server = FakeOpenAIServer(port, rpm, tpm, latency)
+    print(f"Fake OpenAI API on {server.base_url} ({rpm} RPM, {tpm} TPM, {latency}s latency)")
+    server.serve_forever()
@@ -1,8 +1,11 @@
 import streamlit as st
 from langchain.chains.question_answering import load_qa_chain
 from langchain.callbacks import get_openai_callback
-from langchain_community.llms import Ollama
-from langchain.chat_models import ChatOpenAI
+from llm_gateway import get_llm
+from retrieval import retrieve_for_questions, similarity_search_batch
+from query_embeddings import faq_questions
+from index_manager import index_version
+from answer_cache import get_answer_cache, llm_model_name, qa_prompt_id
 import json
 
 # Helper function to load frequently asked questions from a JSON file
@@ -11,8 +14,9 @@ def load_faqs():
         return json.load(f)
 
 # Function to process a question and fetch an answer using the vector store
-def process_faq(question, vectorstore, llm):
-    docs = vectorstore.similarity_search(query=question, k=3)  # Find similar chunks
+def process_faq(question, vectorstore, llm, docs=None):
+    if docs is None:
+        docs = similarity_search_batch(vectorstore, [question], k=3)[0]  # Find similar chunks
     chain = load_qa_chain(llm=llm, chain_type="stuff")  # Load QA chain
     with get_openai_callback() as cb:
         response = chain.run(input_documents=docs, question=question)  # Generate response
@@ -29,21 +33,42 @@ def faqs_page():
 
     # Model selection (reusing the model choice for consistency)
     model_choice = st.selectbox("Select a Model", ["GPT-4o", "LLAMA3"])
-    llm = ChatOpenAI() if model_choice == "GPT-4o" else Ollama(model="llama3")
+    llm = get_llm(model_choice)
 
     # Load FAQs from JSON
     faqs = load_faqs()
     vectorstore = st.session_state.vectorstore  # Load vector store from session state
 
+    # FAQs answered before against this index version, model and prompt are not sent to the LLM again
+    questions = faq_questions(faqs)
+    answer_cache = get_answer_cache()
+    application_id = st.session_state.get("application_id")
+    cache_key = None
+    cached = {}
+    if application_id:
+        cache_key = (application_id, index_version(application_id), llm_model_name(llm), qa_prompt_id(llm))
+        cached = answer_cache.get_many(*cache_key, questions)
+
+    # Retrieve the chunks for every remaining FAQ with one embeddings request
+    missing = [question for question in questions if question not in cached]
+    retrieved = retrieve_for_questions(vectorstore, missing) if missing else {}
+
     # Display and answer each FAQ
     st.subheader("Here are some FAQs based on your uploaded documents:")
-    for faq in faqs["questions"]:
-        question = faq.get("question", "No question provided")
+    for question in questions:
         st.markdown(f"**Q: {question}**")
 
         # Generate an answer
-        answer = process_faq(question, vectorstore, llm)
+        answer = cached.get(question)
+        if answer is None:
+            answer = process_faq(question, vectorstore, llm, retrieved[question])
+            if cache_key:
+                answer_cache.put_many(*cache_key, {question: answer})
         st.write(f"**A:** {answer}")
 
+    answer_stats = answer_cache.stats()
+    st.caption(f"Answer cache: {len(cached)} of {len(questions)} answers reused "
+               f"({answer_stats['hits']} hits, {answer_stats['misses']} misses, {answer_stats['hit_rate']:.0%} hit rate)")
+
 if __name__ == "__main__":
     faqs_page()
@@ -1,6 +1,4 @@
-import openai
 import streamlit as st
-import tempfile
 import fitz
 from docx import Document
 import os
@@ -10,30 +8,8 @@ from reportlab.lib.pagesizes import letter
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib import colors
 from datetime import datetime
-from openai import OpenAI
-
-# Preprocess text to clean and standardize
-def preprocess_text(text):
-    return "\n".join([line.strip() for line in text.splitlines() if line.strip()])
-
-# Extract text from Word documents
-def extract_text_from_docx(doc):
-    full_text = []
-    for paragraph in doc.paragraphs:
-        full_text.append(paragraph.text)
-    for table in doc.tables:
-        for row in table.rows:
-            row_text = [cell.text for cell in row.cells]
-            full_text.append("\t".join(row_text))
-    return "\n".join(full_text)
-
-# Extract text from PDFs
-def extract_text_from_pdf(pdf_path):
-    doc = fitz.open(pdf_path)
-    full_text = []
-    for page in doc:
-        full_text.append(page.get_text("text"))
-    return "\n".join(full_text)
+from extraction import extract_documents
+from llm_gateway import chat
 
 # Call GPT-4 API to generate a procedure manual
 def generate_procedure_manual(content):
@@ -45,8 +21,7 @@ def generate_procedure_manual(content):
     {content}
     """
     try:
-        openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        completion = openai_client.chat.completions.create(
+        content = chat(
             model="gpt-4o",
             messages=[
                 {"role": "system", "content": "You are a helpful assistant for generating procedure manuals."},
@@ -55,7 +30,6 @@ def generate_procedure_manual(content):
             max_tokens=5000,
             temperature=0.7
         )
-        content = completion.choices[0].message.content
         return content
     except Exception as e:
         st.error(f"Error generating procedure manual: {e}")
@@ -198,27 +172,14 @@ def generate_procedure_manual_page():
         try:
             all_extracted_text = []
 
-            # Extract text from each uploaded document
-            for document in documents:
-                if document.type == "application/pdf":
-                    with tempfile.NamedTemporaryFile(delete=False) as tmp_file:
-                        tmp_file.write(document.getvalue())
-                        tmp_file_path = tmp_file.name
-                    all_extracted_text.append(preprocess_text(extract_text_from_pdf(tmp_file_path)))
-
-                elif document.type in [
-                    "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-                    "application/msword",
-                ]:
-                    docx = Document(document)
-                    all_extracted_text.append(preprocess_text(extract_text_from_docx(docx)))
-
-                elif document.type == "text/plain":
-                    all_extracted_text.append(preprocess_text(document.read().decode("utf-8")))
-
-                else:
+            # Extract text from all uploaded documents in parallel, keeping upload order
+            for document, extracted in zip(documents, extract_documents(documents, "procedure_manual")):
+                if extracted.error:
+                    raise Exception(extracted.error)
+                elif extracted.text is None:
                     st.warning(f"Unsupported file type: {document.type}")
                     continue
+                all_extracted_text.append(extracted.text)
 
             if not all_extracted_text:
                 st.warning("No valid content could be extracted from the uploaded documents.")
@@ -0,0 +1,171 @@
+import os
+import json
+import math
+import numpy as np
+
+# "auto" picks the index type from the corpus size; "flat", "hnsw" or "ivfpq" force one
+FAISS_INDEX_TYPE = os.getenv("OA_FAISS_INDEX_TYPE", "auto")
+HNSW_MIN_VECTORS = int(os.getenv("OA_HNSW_MIN_VECTORS", "20000"))
+IVFPQ_MIN_VECTORS = int(os.getenv("OA_IVFPQ_MIN_VECTORS", "200000"))
+HNSW_M = int(os.getenv("OA_HNSW_M", "32"))
+HNSW_EF_SEARCH = int(os.getenv("OA_HNSW_EF_SEARCH", "64"))
+IVF_NLIST = int(os.getenv("OA_IVF_NLIST", "0"))  # 0 = about 4 * sqrt(vectors)
+IVF_NPROBE = int(os.getenv("OA_IVF_NPROBE", "16"))
+PQ_M = int(os.getenv("OA_PQ_M", "64"))
+IVF_MAX_TRAINING_VECTORS = int(os.getenv("OA_IVF_MAX_TRAINING_VECTORS", "100000"))
+# PQ codebooks have 256 centroids each; below this many vectors IVF-PQ cannot be trained sensibly
+IVFPQ_MIN_TRAINING_VECTORS = 1024
+
+INDEX_TYPES = ("flat", "hnsw", "ivfpq")
+
+def index_config_path(directory):
+    return os.path.join(directory, "index_config.json")
+
+# Exact vectors of a lossy (IVF-PQ) base index and their chunk ids, kept so it can be rebuilt or re-typed later
+def exact_vectors_path(directory):
+    return os.path.join(directory, "vectors.npy")
+
+def exact_vector_ids_path(directory):
+    return os.path.join(directory, "vector_ids.json")
+
+def load_index_config(directory):
+    path = index_config_path(directory)
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            return json.load(f)
+    return {"index_type": "flat"}
+
+def save_index_config(directory, config):
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = index_config_path(directory) + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(config, f, indent=4)
+    os.replace(tmp_path, index_config_path(directory))
+
+def choose_index_type(vector_count, configured=None):
+    configured = configured or FAISS_INDEX_TYPE
+    if configured == "ivfpq" and vector_count < IVFPQ_MIN_TRAINING_VECTORS:
+        return "flat"
+    if configured in INDEX_TYPES:
+        return configured
+    if vector_count >= max(IVFPQ_MIN_VECTORS, IVFPQ_MIN_TRAINING_VECTORS):
+        return "ivfpq"
+    if vector_count >= HNSW_MIN_VECTORS:
+        return "hnsw"
+    return "flat"
+
+def index_type_of(index):
+    import faiss
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if faiss.try_extract_index_ivf(index) is not None:
+        return "ivfpq"
+    return "flat"
+
+# Whether reconstruct() returns the vectors exactly as they were added
+def is_exact(index):
+    return index_type_of(index) in ("flat", "hnsw")
+
+def _pq_subquantizers(dimension, preferred=PQ_M):
+    # The number of sub-quantizers has to divide the dimension
+    for m in range(min(preferred, dimension), 0, -1):
+        if dimension % m == 0:
+            return m
+    return 1
+
+def ivf_lists(vector_count):
+    if IVF_NLIST:
+        return IVF_NLIST
+    # Stay within what the training sample can support (about 39 vectors per list)
+    return max(1, min(int(4 * math.sqrt(vector_count)), vector_count // 39))
+
+# Set the query-time parameters that are not (reliably) stored in the index file
+def apply_search_params(index, config=None):
+    config = config or {}
+    index_type = index_type_of(index)
+    if index_type == "hnsw":
+        index.hnsw.efSearch = config.get("ef_search", HNSW_EF_SEARCH)
+    elif index_type == "ivfpq":
+        import faiss
+        faiss.extract_index_ivf(index).nprobe = config.get("nprobe", IVF_NPROBE)
+    return index
+
+# faiss.index_factory description and persisted settings of an index type for a corpus
+def index_description(index_type, vector_count, dimension):
+    if index_type == "hnsw":
+        return f"HNSW{HNSW_M}", {"m": HNSW_M, "ef_search": HNSW_EF_SEARCH}
+    if index_type == "ivfpq":
+        nlist = ivf_lists(vector_count)
+        m = _pq_subquantizers(dimension)
+        return f"IVF{nlist},PQ{m}x8", {"nlist": nlist, "pq_m": m, "nprobe": IVF_NPROBE}
+    return "Flat", {}
+
+# Build and (when needed) train an index of the given type over vectors. Returns (index, config).
+def build_index(vectors, index_type, metric=None):
+    import faiss
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    count, dimension = vectors.shape
+    if metric is None:
+        metric = faiss.METRIC_L2
+    description, params = index_description(index_type, count, dimension)
+    index = faiss.index_factory(dimension, description, metric)
+    if not index.is_trained:
+        training = vectors
+        if count > IVF_MAX_TRAINING_VECTORS:
+            training = vectors[np.random.default_rng(0).choice(count, IVF_MAX_TRAINING_VECTORS, replace=False)]
+        index.train(training)
+    index.add(vectors)
+    config = {"index_type": index_type, "factory": description, "dimension": dimension, "ntotal": count,
+              "metric": int(metric), **params}
+    return apply_search_params(index, config), config
+
+# All vectors of an exact index, in index order
+def reconstruct_all(index):
+    if index.ntotal == 0:
+        return np.zeros((0, index.d), dtype=np.float32)
+    return index.reconstruct_n(0, index.ntotal)
+
+# Approximate resident size of an index in bytes
+def index_memory_bytes(index):
+    index_type = index_type_of(index)
+    if index_type == "hnsw":
+        return index.ntotal * (index.d * 4 + index.hnsw.nb_neighbors(0) * 4)
+    if index_type == "ivfpq":
+        import faiss
+        ivf = faiss.extract_index_ivf(index)
+        return index.ntotal * (ivf.code_size + 8) + ivf.nlist * index.d * 4
+    return index.ntotal * index.d * 4
+
+# Empty copy of an index that keeps its type, trained quantizers and search parameters, refilled with vectors
+def refill_index(index, vectors):
+    import faiss
+    refilled = faiss.clone_index(index)
+    refilled.reset()
+    if len(vectors):
+        refilled.add(np.ascontiguousarray(vectors, dtype=np.float32))
+    return refilled
+
+# Swap the index of a langchain FAISS vectorstore for one over (chunk_ids, vectors). With index_type the
+# index is built (and trained) from scratch; without it the current index is refilled without retraining.
+def replace_vectorstore_index(vectorstore, chunk_ids, vectors, index_type=None):
+    config = None
+    if index_type is None:
+        vectorstore.index = refill_index(vectorstore.index, vectors)
+    else:
+        vectorstore.index, config = build_index(vectors, index_type, vectorstore.index.metric_type)
+    vectorstore.index_to_docstore_id = dict(enumerate(chunk_ids))
+    return config
+
+# Fold a flat segment into a vectorstore of any index type
+def merge_segment(vectorstore, segment_store):
+    if index_type_of(vectorstore.index) == "flat":
+        vectorstore.merge_from(segment_store)
+        return
+    chunk_ids = [segment_store.index_to_docstore_id[position] for position in range(segment_store.index.ntotal)]
+    docs = [segment_store.docstore.search(chunk_id) for chunk_id in chunk_ids]
+    vectors = reconstruct_all(segment_store.index)
+    vectorstore.add_embeddings(
+        [(doc.page_content, vector) for doc, vector in zip(docs, vectors)],
+        metadatas=[doc.metadata for doc in docs],
+        ids=chunk_ids,
+    )
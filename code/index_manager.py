@@ -0,0 +1,399 @@
+import os
+import json
+import shutil
+import time
+import hashlib
+import numpy as np
+from langchain.vectorstores import FAISS
+from vectorstore_cache import get_vectorstore, put_vectorstore, application_lock, manifest_lock
+from index_store import SQLiteDocstore, write_store, read_store, read_legacy_store, is_store, ensure_writable, DOCSTORE_FILE
+from bm25_index import get_bm25_index
+from index_factory import (
+    choose_index_type, index_type_of, is_exact, reconstruct_all, replace_vectorstore_index, merge_segment,
+    apply_search_params, load_index_config, save_index_config, exact_vectors_path, exact_vector_ids_path,
+)
+
+# Layout of embeddings/{application_id}_embeddings.pkl/:
+#   index_config.json       - current base generation, FAISS index type (flat, hnsw or ivfpq) and its parameters
+#   base-<n>/               - compacted base index (absent until the first compaction): index.faiss, docstore.sqlite
+#                             and, for an ivfpq index, vectors.npy + vector_ids.json with the exact vectors to rebuild it
+#   manifest.json           - doc_name -> {hash, chunk_ids, segment}
+#   segments/<doc_hash>/    - one append-only flat segment per indexed document version (index.faiss, docstore.sqlite)
+#   bm25.sqlite             - keyword index (SQLite FTS5) of the live chunks, updated in place as documents change
+# Every compaction writes a new base-<n> and then switches index_config.json to it, so a memory-mapped
+# index file is never overwritten. index.faiss + index.pkl written by FAISS.save_local are migrated on load.
+MAX_SEGMENTS_BEFORE_COMPACTION = int(os.getenv("OA_MAX_INDEX_SEGMENTS", "20"))
+
+def embeddings_dir(application_id):
+    return f"embeddings/{application_id}_embeddings.pkl"
+
+def manifest_path(application_id):
+    return os.path.join(embeddings_dir(application_id), "manifest.json")
+
+def segment_dir(application_id, segment):
+    return os.path.join(embeddings_dir(application_id), "segments", segment)
+
+def bm25_index_path(application_id):
+    return os.path.join(embeddings_dir(application_id), "bm25.sqlite")
+
+def document_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+def load_manifest(application_id):
+    path = manifest_path(application_id)
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            return json.load(f)
+    return {"documents": {}, "deleted_ids": []}
+
+def save_manifest(application_id, manifest):
+    os.makedirs(embeddings_dir(application_id), exist_ok=True)
+    tmp_path = manifest_path(application_id) + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=4)
+    os.replace(tmp_path, manifest_path(application_id))
+
+def base_dir(application_id, config=None):
+    config = config or load_index_config(embeddings_dir(application_id))
+    return os.path.join(embeddings_dir(application_id), config["base"]) if config.get("base") else None
+
+def has_legacy_base(application_id):
+    return os.path.exists(os.path.join(embeddings_dir(application_id), "index.pkl"))
+
+def has_base_index(application_id):
+    return base_dir(application_id) is not None or has_legacy_base(application_id)
+
+# Changes whenever a document is added or replaced and whenever the base is rewritten by a compaction.
+# Answers generated against an older version of the index are not reused (see answer_cache).
+def index_version(application_id):
+    manifest = load_manifest(application_id)
+    documents = sorted((doc_name, entry["hash"]) for doc_name, entry in manifest["documents"].items())
+    base = load_index_config(embeddings_dir(application_id)).get("base")
+    return hashlib.sha256(json.dumps([documents, base]).encode("utf-8")).hexdigest()[:16]
+
+def is_document_indexed(manifest, doc_hash):
+    return any(entry["hash"] == doc_hash for entry in manifest["documents"].values())
+
+# (chunk_id, text) of every chunk in a loaded vectorstore
+def _docstore_texts(vectorstore):
+    # An SQLite docstore hands back every text in one query instead of one lookup per chunk
+    if hasattr(vectorstore.docstore, "iter_texts"):
+        yield from vectorstore.docstore.iter_texts()
+        return
+    for chunk_id in vectorstore.index_to_docstore_id.values():
+        doc = vectorstore.docstore.search(chunk_id)
+        if not isinstance(doc, str):
+            yield chunk_id, doc.page_content
+
+# Open the application's on-disk BM25 index and attach it to the vectorstore for hybrid retrieval.
+# Indexes created before it existed get it built once from the vectorstore's chunks.
+def attach_bm25_index(application_id, vectorstore, manifest):
+    deleted = set(manifest.get("deleted_ids", []))
+    items = lambda: ((chunk_id, text) for chunk_id, text in _docstore_texts(vectorstore) if chunk_id not in deleted)
+    vectorstore.bm25_index = get_bm25_index(bm25_index_path(application_id), items)
+    return vectorstore.bm25_index
+
+def _load_segment(path, embeddings):
+    if is_store(path):
+        return read_store(path, embeddings)
+    return read_legacy_store(path, embeddings)
+
+# Load the compacted base index and merge every live segment into it. The result is built privately and
+# only shared once returned, so only the manifest lock is held, against an upload or a fold in another session. Merging a segment copies the index into memory
+# and puts its chunk texts in the docstore's in-memory overlay, so segments found on load are folded into a
+# new base, which is then loaded memory-mapped with its texts left on disk.
+def load_index(application_id, embeddings):
+    with manifest_lock(application_id):
+        manifest = load_manifest(application_id)
+        config = load_index_config(embeddings_dir(application_id))
+        if not config.get("base") and has_legacy_base(application_id):
+            config = _migrate_legacy_base(application_id, embeddings)
+
+        vectorstore = None
+        if config.get("base"):
+            # IVF-PQ codes are small and its inverted lists cannot be mapped writable, so only flat and HNSW vectors are mapped
+            vectorstore = read_store(base_dir(application_id, config), embeddings, mmap=config.get("index_type", "flat") != "ivfpq")
+            apply_search_params(vectorstore.index, config)
+
+            # Chunks of replaced documents that are still inside the base index are skipped at search time
+            # rather than deleted, which would copy a memory-mapped index into memory on every load
+            vectorstore.deleted_ids = set(manifest.get("deleted_ids", [])) & set(vectorstore.index_to_docstore_id.values())
+
+        merged = 0
+        for segment in sorted({entry["segment"] for entry in manifest["documents"].values() if entry.get("segment")}):
+            path = segment_dir(application_id, segment)
+            if not os.path.exists(path):
+                continue
+            merged += 1
+            segment_store = _load_segment(path, embeddings)
+            segment_ids = set(segment_store.index_to_docstore_id.values())
+            if vectorstore is None:
+                vectorstore = segment_store
+            elif not segment_ids & (set(vectorstore.index_to_docstore_id.values()) - getattr(vectorstore, "deleted_ids", set())):
+                # A segment already folded into the base by an interrupted compaction is skipped
+                ensure_writable(vectorstore)
+                if segment_ids & getattr(vectorstore, "deleted_ids", set()):
+                    # A replaced version was uploaded again; its old copy has to leave the base before the ids are reused
+                    purge_deleted(application_id, manifest, vectorstore)
+                merge_segment(vectorstore, segment_store)
+        if merged:
+            compact_index(application_id, vectorstore, force=True)
+            return load_index(application_id, embeddings)
+        if vectorstore is not None:
+            vectorstore.lock = application_lock(application_id)
+            attach_bm25_index(application_id, vectorstore, manifest)
+        return vectorstore
+
+# The application's index if it has one, shared across sessions through the process-wide cache
+def load_embeddings(application_id, embeddings):
+    if os.path.exists(embeddings_dir(application_id)):
+        return get_vectorstore(application_id, lambda: load_index(application_id, embeddings))
+    return None
+
+# Add one document's chunks to the index, skipping unchanged documents and replacing older versions.
+# Returns the (possibly new) vectorstore and one of "skipped", "added" or "replaced".
+def index_document(application_id, vectorstore, doc_name, doc_hash, chunks, embeddings, metadatas=None):
+    if metadatas is None:
+        metadatas = [{} for _ in chunks]
+    vectorstore, status, _ = index_document_batches(application_id, vectorstore, doc_name, doc_hash, [(chunks, metadatas)], embeddings)
+    return vectorstore, status
+
+# Same as index_document, but takes an iterable of (texts, metadatas) batches. Each batch is embedded and
+# added as soon as it arrives, so a long document is searchable before the last batch is produced.
+# on_batch(chunk_count) is called after every batch. Returns (vectorstore, status, chunk_count).
+# The vectorstore is shared by every session, so it is only changed under the application lock;
+# embedding happens outside it, so searches keep running. The manifest lock is held throughout, because
+# each batch goes into the shared index as soon as it is embedded: uploads to one application run one after
+# another, and the skip check and the manifest update see every earlier upload. A replaced version stays in the index and on disk until the new one has
+# been embedded and its segment written; if that fails, the new chunks are taken out again and the
+# error is raised with the old version intact.
+def index_document_batches(application_id, vectorstore, doc_name, doc_hash, batches, embeddings, on_batch=None):
+    with manifest_lock(application_id):
+        manifest = load_manifest(application_id)
+        if is_document_indexed(manifest, doc_hash):
+            return vectorstore, "skipped", 0
+
+        # Another session may have indexed or compacted while this one waited for the lock, so work on the
+        # current shared vectorstore rather than the one this session loaded earlier
+        vectorstore = get_vectorstore(application_id, lambda: load_index(application_id, embeddings))
+
+        lock = application_lock(application_id)
+        previous = manifest["documents"].get(doc_name)
+        with lock:
+            if vectorstore is not None:
+                vectorstore.lock = lock
+                bm25 = attach_bm25_index(application_id, vectorstore, manifest)
+                # The index is about to be made writable anyway, so drop the chunks masked on load now
+                purge_deleted(application_id, manifest, vectorstore)
+            else:
+                bm25 = get_bm25_index(bm25_index_path(application_id))
+
+        # When there is no index yet the segment store doubles as the application's vectorstore
+        shares_segment = vectorstore is None
+        segment_store = None
+        chunk_ids = []
+        try:
+            for texts, metadatas in batches:
+                if not texts:
+                    continue
+                ids = [f"{doc_hash[:16]}-{len(chunk_ids) + i}" for i in range(len(texts))]
+                metadatas = [{"source": doc_name, "doc_hash": doc_hash, **metadata} for metadata in metadatas]
+                text_embeddings = list(zip(texts, embeddings.embed_documents(texts)))
+
+                with lock:
+                    if segment_store is None:
+                        segment_store = FAISS.from_embeddings(text_embeddings, embeddings, metadatas=metadatas, ids=ids)
+                        segment_store.lock = lock
+                    else:
+                        segment_store.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+                    if not shares_segment:
+                        ensure_writable(vectorstore)
+                        vectorstore.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+                    bm25.add(ids, texts)
+                    chunk_ids.extend(ids)
+                if on_batch:
+                    on_batch(len(chunk_ids))
+
+            # Persist only this document's chunks as a new segment
+            segment = None
+            if segment_store is not None:
+                shutil.rmtree(segment_dir(application_id, doc_hash), ignore_errors=True)
+                write_store(segment_dir(application_id, doc_hash), segment_store)
+                segment = doc_hash
+        except BaseException:
+            with lock:
+                if not shares_segment:
+                    delete_chunks(application_id, manifest, vectorstore, chunk_ids)
+                bm25.remove(chunk_ids)
+            shutil.rmtree(segment_dir(application_id, doc_hash), ignore_errors=True)
+            raise
+
+        if shares_segment:
+            vectorstore = segment_store
+
+        # The new version is on disk, so the old one can go. Its manifest entry is replaced first, since
+        # refilling a non-flat index reads the exact vectors of every remaining chunk through the manifest.
+        manifest["documents"][doc_name] = {"hash": doc_hash, "chunk_ids": chunk_ids, "segment": segment}
+        status = "added"
+        if previous:
+            with lock:
+                if vectorstore is not None and not shares_segment and previous["chunk_ids"]:
+                    delete_chunks(application_id, manifest, vectorstore, previous["chunk_ids"])
+                bm25.remove(previous["chunk_ids"])
+            if not previous.get("segment"):
+                # The old version lives in the compacted base, so remember to drop it on load
+                manifest.setdefault("deleted_ids", []).extend(previous["chunk_ids"])
+            status = "replaced"
+
+        save_manifest(application_id, manifest)
+        if previous:
+            remove_unused_segment(application_id, manifest, previous.get("segment"))
+        if vectorstore is not None:
+            vectorstore.bm25_index = bm25
+            put_vectorstore(application_id, vectorstore)
+        return vectorstore, status, len(chunk_ids)
+
+# Delete a segment directory once the saved manifest no longer refers to it
+def remove_unused_segment(application_id, manifest, segment):
+    # Another document name may point at the same content
+    if not segment or any(entry.get("segment") == segment for entry in manifest["documents"].values()):
+        return
+    shutil.rmtree(segment_dir(application_id, segment), ignore_errors=True)
+
+# Exact vectors by chunk id as stored on disk: the vectors file of an ivfpq base plus the flat segments.
+# Segment positions follow the order of the document's chunk_ids in the manifest.
+def stored_exact_vectors(application_id, manifest):
+    import faiss
+    directory = base_dir(application_id)
+    vectors = {}
+    if directory and os.path.exists(exact_vectors_path(directory)):
+        with open(exact_vector_ids_path(directory), "r") as f:
+            vectors.update(zip(json.load(f), np.load(exact_vectors_path(directory), mmap_mode="r")))
+    for entry in manifest["documents"].values():
+        path = os.path.join(segment_dir(application_id, entry["segment"]), "index.faiss") if entry.get("segment") else None
+        if path and os.path.exists(path):
+            vectors.update(zip(entry["chunk_ids"], reconstruct_all(faiss.read_index(path))))
+    return vectors
+
+# Exact vectors of the given chunks of a loaded vectorstore, in the given order
+def exact_vectors(application_id, manifest, vectorstore, chunk_ids):
+    if not chunk_ids:
+        return np.zeros((0, vectorstore.index.d), dtype=np.float32)
+    if is_exact(vectorstore.index):
+        positions = {chunk_id: position for position, chunk_id in vectorstore.index_to_docstore_id.items()}
+        return reconstruct_all(vectorstore.index)[[positions[chunk_id] for chunk_id in chunk_ids]]
+    stored = stored_exact_vectors(application_id, manifest)
+    return np.vstack([stored[chunk_id] for chunk_id in chunk_ids]).astype(np.float32)
+
+# Remove chunks from the in-memory index. Only a flat index can drop vectors in place (HNSW cannot remove
+# them and IVF keeps stale labels that langchain's id mapping does not expect), so others are refilled.
+def delete_chunks(application_id, manifest, vectorstore, chunk_ids):
+    chunk_ids = set(chunk_ids) & set(vectorstore.index_to_docstore_id.values())
+    if not chunk_ids:
+        return
+    ensure_writable(vectorstore)
+    if index_type_of(vectorstore.index) == "flat":
+        vectorstore.delete(list(chunk_ids))
+        return
+    keep = [chunk_id for _, chunk_id in sorted(vectorstore.index_to_docstore_id.items()) if chunk_id not in chunk_ids]
+    vectors = exact_vectors(application_id, manifest, vectorstore, keep)
+    vectorstore.docstore.delete(list(chunk_ids))
+    replace_vectorstore_index(vectorstore, keep, vectors)
+
+# Remove the chunks masked on load (deleted_ids) from the in-memory index. Done by writes, which need a
+# writable index anyway, and before compaction so they are not written into the new base.
+def purge_deleted(application_id, manifest, vectorstore):
+    deleted = getattr(vectorstore, "deleted_ids", None)
+    if deleted:
+        delete_chunks(application_id, manifest, vectorstore, deleted)
+        vectorstore.deleted_ids = set()
+
+def _write_exact_vectors(directory, chunk_ids, vectors):
+    np.save(exact_vectors_path(directory), vectors)
+    with open(exact_vector_ids_path(directory), "w") as f:
+        json.dump(chunk_ids, f)
+
+# Bring the in-memory index to the type chosen for the corpus size (or OA_FAISS_INDEX_TYPE), training it
+# when needed. An ivfpq index is only retrained once the corpus has doubled since it was last trained.
+# Returns the index config to persist and, for ivfpq, the (chunk_ids, exact vectors) to keep with it.
+def _apply_index_type(application_id, manifest, vectorstore):
+    config = load_index_config(embeddings_dir(application_id))
+    chunk_ids = [vectorstore.index_to_docstore_id[position] for position in range(vectorstore.index.ntotal)]
+    index_type = choose_index_type(len(chunk_ids))
+    current_type = index_type_of(vectorstore.index)
+
+    vectors = None
+    if index_type != current_type or index_type == "ivfpq":
+        vectors = exact_vectors(application_id, manifest, vectorstore, chunk_ids)
+    if index_type != current_type or (index_type == "ivfpq" and len(chunk_ids) >= 2 * config.get("trained_on", 0)):
+        config = replace_vectorstore_index(vectorstore, chunk_ids, vectors, index_type)
+        config["trained_on"] = len(chunk_ids) if index_type == "ivfpq" else 0
+
+    config.update({"index_type": index_type, "ntotal": len(chunk_ids), "dimension": vectorstore.index.d})
+    return config, (chunk_ids, vectors) if index_type == "ivfpq" else None
+
+# Write the vectorstore as a new base generation directory and return its name
+def _write_base(application_id, vectorstore, exact=None):
+    generation = f"base-{time.time_ns()}"
+    path = os.path.join(embeddings_dir(application_id), generation)
+    write_store(path, vectorstore)
+    if exact is not None:
+        _write_exact_vectors(path, *exact)
+    return generation
+
+# Point the in-memory vectorstore at the new base docstore, so chunk texts leave memory, and remove older
+# bases. A file still open elsewhere (Windows) is left behind and retried on the next compaction.
+def _switch_base(application_id, vectorstore, generation):
+    directory = embeddings_dir(application_id)
+    previous = vectorstore.docstore
+    vectorstore.docstore = SQLiteDocstore(os.path.join(directory, generation, DOCSTORE_FILE))
+    if isinstance(previous, SQLiteDocstore):
+        previous.close()
+    for name in os.listdir(directory):
+        if name.startswith("base-") and name != generation:
+            shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+    for name in ("index.faiss", "index.pkl", "vectors.npy", "vector_ids.json"):
+        if os.path.exists(os.path.join(directory, name)):
+            os.remove(os.path.join(directory, name))
+
+# One-off conversion of a pickled FAISS.save_local base into the SQLite layout
+def _migrate_legacy_base(application_id, embeddings):
+    directory = embeddings_dir(application_id)
+    vectorstore = read_legacy_store(directory, embeddings)
+    config = load_index_config(directory)
+    generation = _write_base(application_id, vectorstore)
+    for name in ("vectors.npy", "vector_ids.json"):
+        if os.path.exists(os.path.join(directory, name)):
+            os.replace(os.path.join(directory, name), os.path.join(directory, generation, name))
+    config.update({"base": generation, "index_type": index_type_of(vectorstore.index), "ntotal": vectorstore.index.ntotal})
+    save_index_config(directory, config)
+    _switch_base(application_id, vectorstore, generation)
+    return config
+
+# Rewrite the full index as the base and drop the segments once there are too many of them, or once the
+# corpus has grown (or shrunk) past the size where a different index type is chosen for it.
+# Searches wait on the application lock until the new base is in place; uploads wait on the manifest lock.
+def compact_index(application_id, vectorstore, force=False):
+    if vectorstore is None:
+        return False
+    with manifest_lock(application_id):
+        manifest = load_manifest(application_id)
+        segments = {entry["segment"] for entry in manifest["documents"].values() if entry.get("segment")}
+        live_count = vectorstore.index.ntotal - len(manifest.get("deleted_ids", []))
+        retype = choose_index_type(live_count) != index_type_of(vectorstore.index)
+        if not force and not retype and len(segments) <= MAX_SEGMENTS_BEFORE_COMPACTION:
+            return False
+
+        with application_lock(application_id):
+            purge_deleted(application_id, manifest, vectorstore)
+            index_config, exact = _apply_index_type(application_id, manifest, vectorstore)
+            index_config["base"] = _write_base(application_id, vectorstore, exact)
+            save_index_config(embeddings_dir(application_id), index_config)
+            _switch_base(application_id, vectorstore, index_config["base"])
+            for entry in manifest["documents"].values():
+                entry["segment"] = None
+            manifest["deleted_ids"] = []
+            save_manifest(application_id, manifest)
+            shutil.rmtree(os.path.join(embeddings_dir(application_id), "segments"), ignore_errors=True)
+        put_vectorstore(application_id, vectorstore)
+        return True
@@ -0,0 +1,116 @@
+import os
+import json
+import sqlite3
+import threading
+from langchain.docstore.base import Docstore, AddableMixin
+from langchain.docstore.document import Document
+
+# Memory-map the vectors of flat and HNSW indexes instead of reading them into process memory
+MMAP_INDEX = os.getenv("OA_MMAP_INDEX", "1") == "1"
+
+INDEX_FILE = "index.faiss"
+DOCSTORE_FILE = "docstore.sqlite"
+
+class SQLiteDocstore(Docstore, AddableMixin):
+    """Chunk texts in an indexed SQLite file, fetched one id at a time for the search hits.
+    Chunks added or deleted after loading are kept in memory until the store is written again."""
+
+    def __init__(self, path):
+        self.path = path
+        self.pending = {}  # chunk_id -> Document added since the file was written
+        self.deleted = set()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+
+    def search(self, search):
+        if search in self.pending:
+            return self.pending[search]
+        if search in self.deleted:
+            return f"ID {search} not found."
+        with self._lock:
+            row = self._conn.execute("SELECT text, metadata FROM chunks WHERE chunk_id = ?", (search,)).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return Document(page_content=row[0], metadata=json.loads(row[1]))
+
+    def add(self, texts):
+        for chunk_id, doc in texts.items():
+            self.deleted.discard(chunk_id)
+            self.pending[chunk_id] = doc
+
+    def delete(self, ids):
+        for chunk_id in ids:
+            if self.pending.pop(chunk_id, None) is None:
+                self.deleted.add(chunk_id)
+
+    # position -> chunk_id of the vectors in the index file written with this docstore
+    def index_to_docstore_id(self):
+        with self._lock:
+            return dict(self._conn.execute("SELECT position, chunk_id FROM chunks ORDER BY position").fetchall())
+
+    # (chunk_id, text) of every live chunk, read in one pass (used to build the BM25 index)
+    def iter_texts(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT chunk_id, text FROM chunks ORDER BY position").fetchall()
+        for chunk_id, text in rows:
+            if chunk_id not in self.deleted and chunk_id not in self.pending:
+                yield chunk_id, text
+        for chunk_id, doc in list(self.pending.items()):
+            yield chunk_id, doc.page_content
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def _write_docstore(path, vectorstore):
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("DROP TABLE IF EXISTS chunks")
+        conn.execute("CREATE TABLE chunks (position INTEGER PRIMARY KEY, chunk_id TEXT NOT NULL UNIQUE, text TEXT NOT NULL, metadata TEXT NOT NULL)")
+        rows = []
+        for position, chunk_id in sorted(vectorstore.index_to_docstore_id.items()):
+            doc = vectorstore.docstore.search(chunk_id)
+            rows.append((position, chunk_id, doc.page_content, json.dumps(doc.metadata)))
+            if len(rows) >= 1000:
+                conn.executemany("INSERT INTO chunks VALUES (?, ?, ?, ?)", rows)
+                rows = []
+        conn.executemany("INSERT INTO chunks VALUES (?, ?, ?, ?)", rows)
+        conn.commit()
+    finally:
+        conn.close()
+
+# Write a vectorstore as index.faiss plus docstore.sqlite. No pickle is involved, so loading it back
+# never executes code from the file. path should be a fresh directory: files that may be memory-mapped
+# are never overwritten in place.
+def write_store(path, vectorstore):
+    import faiss
+    os.makedirs(path, exist_ok=True)
+    faiss.write_index(vectorstore.index, os.path.join(path, INDEX_FILE))
+    _write_docstore(os.path.join(path, DOCSTORE_FILE), vectorstore)
+
+def is_store(path):
+    return os.path.exists(os.path.join(path, DOCSTORE_FILE))
+
+# Load a store written by write_store. With mmap the vectors stay in the page cache, shared by every
+# process, until the index is first modified (see ensure_writable).
+def read_store(path, embeddings, mmap=False):
+    import faiss
+    from langchain.vectorstores import FAISS
+    flags = faiss.IO_FLAG_MMAP_IFC if mmap and MMAP_INDEX else 0
+    index = faiss.read_index(os.path.join(path, INDEX_FILE), flags)
+    docstore = SQLiteDocstore(os.path.join(path, DOCSTORE_FILE))
+    vectorstore = FAISS(embeddings, index, docstore, docstore.index_to_docstore_id())
+    vectorstore.index_is_mapped = bool(flags)
+    return vectorstore
+
+# Stores saved by FAISS.save_local before the SQLite layout. Only used to migrate indexes this app wrote.
+def read_legacy_store(path, embeddings):
+    from langchain.vectorstores import FAISS
+    return FAISS.load_local(path, embeddings=embeddings, allow_dangerous_deserialization=True)
+
+# A memory-mapped index cannot grow or shrink (faiss aborts the process), so take a private copy first
+def ensure_writable(vectorstore):
+    if getattr(vectorstore, "index_is_mapped", False):
+        import faiss
+        vectorstore.index = faiss.deserialize_index(faiss.serialize_index(vectorstore.index))
+        vectorstore.index_is_mapped = False
@@ -0,0 +1,88 @@
+import os
+import queue
+import threading
+from extraction import open_pdf, pdf_page_blocks, pdf_page_text
+from chunking import chunk_pages
+
+# PDFs with at least this many pages are streamed page by page instead of extracted in one piece
+STREAMING_MIN_PAGES = int(os.getenv("OA_STREAMING_MIN_PAGES", "200"))
+EMBED_BATCH_SIZE = int(os.getenv("OA_EMBED_BATCH_SIZE", "64"))
+# Batches the reader may get ahead of the embedder before it blocks
+INGEST_QUEUE_BATCHES = int(os.getenv("OA_INGEST_QUEUE_BATCHES", "4"))
+
+_DONE = object()
+
+def pdf_page_count(data):
+    with open_pdf(data) as doc:
+        return doc.page_count
+
+# Whether an upload should go through the streaming pipeline rather than whole-document extraction
+def should_stream(mime_type, data):
+    if mime_type != "application/pdf":
+        return False
+    try:
+        return pdf_page_count(data) >= STREAMING_MIN_PAGES
+    except Exception:
+        return False
+
+# page: yield (page_number, text) one page at a time, with the same block-based page text as whole-document
+# extraction so a PDF is chunked and cited alike on both paths. Only the current page is held in memory, so
+# streamed PDFs bypass the extraction cache, which stores (and returns) a document's pages in one piece.
+def iter_pdf_pages(data):
+    with open_pdf(data) as doc:
+        for page in doc:
+            yield page.number + 1, pdf_page_text(pdf_page_blocks(page))
+
+# clean + chunk: pack the cleaned lines of consecutive pages into token-budgeted chunks and group them into embedding batches
+def iter_chunk_batches(pages, batch_size=EMBED_BATCH_SIZE):
+    texts = []
+    metadatas = []
+    for chunk, metadata in chunk_pages(pages):
+        texts.append(chunk)
+        metadatas.append(metadata)
+        if len(texts) >= batch_size:
+            yield texts, metadatas
+            texts, metadatas = [], []
+    if texts:
+        yield texts, metadatas
+
+# Run a batch iterator on a reader thread behind a bounded queue. The reader blocks once it is
+# max_batches ahead, so at most that many batches are held in memory while the caller embeds.
+def prefetch(batches, max_batches=INGEST_QUEUE_BATCHES):
+    buffer = queue.Queue(maxsize=max(1, max_batches))
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def reader():
+        try:
+            for batch in batches:
+                if not put(batch):
+                    return
+            put(_DONE)
+        except Exception as e:
+            put(e)
+
+    thread = threading.Thread(target=reader, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+# Full pipeline for one PDF: page -> clean -> chunk -> (prefetched) batches ready for index_document_batches
+def stream_pdf_batches(data, batch_size=EMBED_BATCH_SIZE, max_batches=INGEST_QUEUE_BATCHES):
+    return prefetch(iter_chunk_batches(iter_pdf_pages(data), batch_size), max_batches)
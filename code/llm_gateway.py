@@ -0,0 +1,260 @@
+import os
+import time
+import threading
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Optional
+from llm_scheduler import LLM_SCHEDULER, scheduled_transport, async_scheduled_transport
+
+# One process-wide entry point for every LLM call. OpenAI and Ollama each get a single keep-alive HTTP
+# connection pool shared by all pages, sessions and worker threads, with separate pools for async callers.
+# OpenAI requests are also rate limited, scheduled fairly and retried by llm_scheduler.
+
+LLM_MAX_CONNECTIONS = int(os.getenv("OA_LLM_MAX_CONNECTIONS", "20"))
+LLM_KEEPALIVE_SECONDS = float(os.getenv("OA_LLM_KEEPALIVE_SECONDS", "120"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("OA_LLM_TIMEOUT_SECONDS", "600"))
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+DEFAULT_CHAT_MODEL = "gpt-4o"
+
+class GatewayStats:
+    """Per-provider call latency and HTTP connection reuse."""
+
+    def __init__(self, window=1000):
+        self._lock = threading.Lock()
+        self.calls = defaultdict(int)
+        self.errors = defaultdict(int)
+        self.latencies = defaultdict(lambda: deque(maxlen=window))  # seconds of the most recent calls
+        self.requests = defaultdict(int)
+        self.connections = defaultdict(int)  # requests that had to open a new connection
+
+    def record_call(self, provider, seconds, error=False):
+        with self._lock:
+            self.calls[provider] += 1
+            self.errors[provider] += int(error)
+            self.latencies[provider].append(seconds)
+
+    def record_request(self, provider, new_connection):
+        with self._lock:
+            self.requests[provider] += 1
+            self.connections[provider] += int(new_connection)
+
+    def snapshot(self):
+        with self._lock:
+            stats = {}
+            for provider in set(self.calls) | set(self.requests):
+                latencies = sorted(self.latencies[provider])
+                requests = self.requests[provider]
+                stats[provider] = {
+                    "calls": self.calls[provider],
+                    "errors": self.errors[provider],
+                    "avg_ms": sum(latencies) / len(latencies) * 1000 if latencies else 0.0,
+                    "p95_ms": latencies[int(0.95 * (len(latencies) - 1))] * 1000 if latencies else 0.0,
+                    "requests": requests,
+                    "connections_opened": self.connections[provider],
+                    "connection_reuse_rate": (requests - self.connections[provider]) / requests if requests else 0.0,
+                }
+            return stats
+
+_stats = GatewayStats()
+
+def gateway_stats():
+    return _stats.snapshot()
+
+@contextmanager
+def _timed(provider):
+    start_time = time.perf_counter()
+    error = False
+    try:
+        yield
+    except Exception:
+        error = True
+        raise
+    finally:
+        _stats.record_call(provider, time.perf_counter() - start_time, error)
+
+# httpx event hooks that record, through httpcore's trace extension, whether each request opened a new
+# TCP connection or reused a pooled one
+def _event_hooks(provider):
+    def on_request(request):
+        def trace(event_name, info):
+            if event_name == "connection.connect_tcp.started":
+                request.extensions["oa_new_connection"] = True
+        request.extensions["trace"] = trace
+
+    def on_response(response):
+        _stats.record_request(provider, response.request.extensions.get("oa_new_connection", False))
+
+    return {"request": [on_request], "response": [on_response]}
+
+def _async_event_hooks(provider):
+    async def on_request(request):
+        async def trace(event_name, info):
+            if event_name == "connection.connect_tcp.started":
+                request.extensions["oa_new_connection"] = True
+        request.extensions["trace"] = trace
+
+    async def on_response(response):
+        _stats.record_request(provider, response.request.extensions.get("oa_new_connection", False))
+
+    return {"request": [on_request], "response": [on_response]}
+
+def _pool_limits():
+    import httpx
+    return httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_CONNECTIONS,
+                        keepalive_expiry=LLM_KEEPALIVE_SECONDS)
+
+def _pool_settings(timeout=None):
+    import httpx
+    return {"limits": _pool_limits(), "timeout": httpx.Timeout(timeout or LLM_TIMEOUT_SECONDS, connect=10.0)}
+
+# The scheduler's transport does the retrying, so the SDK's own retries are turned off while it is enabled
+OPENAI_SDK_RETRIES = 0 if LLM_SCHEDULER else 2
+
+@lru_cache(maxsize=None)
+def get_openai_client():
+    import httpx
+    from openai import OpenAI
+    transport = scheduled_transport(httpx.HTTPTransport(limits=_pool_limits()))
+    http_client = httpx.Client(transport=transport, event_hooks=_event_hooks("openai"), **_pool_settings())
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=http_client, max_retries=OPENAI_SDK_RETRIES)
+
+@lru_cache(maxsize=None)
+def get_async_openai_client():
+    import httpx
+    from openai import AsyncOpenAI
+    transport = async_scheduled_transport(httpx.AsyncHTTPTransport(limits=_pool_limits()))
+    http_client = httpx.AsyncClient(transport=transport, event_hooks=_async_event_hooks("openai"), **_pool_settings())
+    return AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=http_client, max_retries=OPENAI_SDK_RETRIES)
+
+# The Ollama client takes its timeout only at construction, so each distinct timeout gets its own pool
+@lru_cache(maxsize=None)
+def get_ollama_client(timeout=None):
+    import ollama
+    return ollama.Client(host=OLLAMA_HOST, event_hooks=_event_hooks("ollama"), **_pool_settings(timeout))
+
+@lru_cache(maxsize=None)
+def get_async_ollama_client(timeout=None):
+    import ollama
+    return ollama.AsyncClient(host=OLLAMA_HOST, event_hooks=_async_event_hooks("ollama"), **_pool_settings(timeout))
+
+# Whether an LLM call failed because its request timed out (OpenAI SDK or plain httpx, as raised by Ollama)
+def is_timeout_error(error):
+    import httpx
+    if isinstance(error, httpx.TimeoutException):
+        return True
+    try:
+        from openai import APITimeoutError
+    except ImportError:
+        return False
+    return isinstance(error, APITimeoutError)
+
+# Text of an OpenAI chat completion; kwargs are passed through (max_tokens, temperature, ...)
+def chat(messages, model=DEFAULT_CHAT_MODEL, **kwargs):
+    with _timed("openai"):
+        completion = get_openai_client().chat.completions.create(model=model, messages=messages, **kwargs)
+    return completion.choices[0].message.content
+
+async def achat(messages, model=DEFAULT_CHAT_MODEL, **kwargs):
+    with _timed("openai"):
+        completion = await get_async_openai_client().chat.completions.create(model=model, messages=messages, **kwargs)
+    return completion.choices[0].message.content
+
+# Ollama /api/generate response; kwargs are passed through (system, options, ...)
+def ollama_generate(model, prompt, timeout=None, **kwargs):
+    with _timed("ollama"):
+        return get_ollama_client(timeout).generate(model=model, prompt=prompt, **kwargs)
+
+async def aollama_generate(model, prompt, timeout=None, **kwargs):
+    with _timed("ollama"):
+        return await get_async_ollama_client(timeout).generate(model=model, prompt=prompt, **kwargs)
+
+def _latency_callback(provider):
+    from langchain.callbacks.base import BaseCallbackHandler
+
+    # Times LangChain model runs, which call the pooled clients directly rather than through chat()
+    class LatencyCallback(BaseCallbackHandler):
+        def __init__(self):
+            self.started = {}
+
+        def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+            self.started[run_id] = time.perf_counter()
+
+        def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+            self.started[run_id] = time.perf_counter()
+
+        def on_llm_end(self, response, *, run_id, **kwargs):
+            start_time = self.started.pop(run_id, None)
+            if start_time is not None:
+                _stats.record_call(provider, time.perf_counter() - start_time)
+
+        def on_llm_error(self, error, *, run_id, **kwargs):
+            start_time = self.started.pop(run_id, None)
+            if start_time is not None:
+                _stats.record_call(provider, time.perf_counter() - start_time, error=True)
+
+    return LatencyCallback()
+
+# LangChain chat model on the pooled OpenAI clients. streaming=True makes the model report each token
+# to the run's callbacks as it arrives. timeout (seconds) bounds each API request instead of the
+# gateway-wide OA_LLM_TIMEOUT_SECONDS; the copied clients keep sharing the same connection pool.
+@lru_cache(maxsize=None)
+def get_chat_openai(model=None, streaming=False, timeout=None):
+    from langchain.chat_models import ChatOpenAI
+    client, async_client = get_openai_client(), get_async_openai_client()
+    if timeout:
+        client, async_client = client.with_options(timeout=timeout), async_client.with_options(timeout=timeout)
+    params = {
+        "client": client.chat.completions,
+        "async_client": async_client.chat.completions,
+        "streaming": streaming,
+        "callbacks": [_latency_callback("openai")],
+    }
+    return ChatOpenAI(model=model, **params) if model else ChatOpenAI(**params)
+
+# LangChain OpenAI embeddings on the pooled OpenAI clients, so embedding requests share their connections
+# and go through the scheduler like chat requests
+@lru_cache(maxsize=None)
+def get_openai_embeddings():
+    from langchain.embeddings.openai import OpenAIEmbeddings
+    return OpenAIEmbeddings(client=get_openai_client().embeddings, async_client=get_async_openai_client().embeddings)
+
+# LangChain LLM on the pooled Ollama clients (langchain_community's Ollama opens a new connection per call)
+@lru_cache(maxsize=None)
+def get_ollama(model="llama3", timeout=None):
+    from langchain_core.language_models.llms import LLM
+    from langchain_core.outputs import GenerationChunk
+
+    class GatewayOllama(LLM):
+        model: str
+        timeout: Optional[float] = None
+
+        @property
+        def _llm_type(self):
+            return "ollama"
+
+        @property
+        def _identifying_params(self):
+            return {"model": self.model}
+
+        def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+            return ollama_generate(self.model, prompt, self.timeout, options={"stop": stop} if stop else None)["response"]
+
+        async def _acall(self, prompt, stop=None, run_manager=None, **kwargs):
+            response = await aollama_generate(self.model, prompt, self.timeout, options={"stop": stop} if stop else None)
+            return response["response"]
+
+        def _stream(self, prompt, stop=None, run_manager=None, **kwargs):
+            with _timed("ollama"):
+                for part in get_ollama_client(self.timeout).generate(model=self.model, prompt=prompt, stream=True,
+                                                         options={"stop": stop} if stop else None):
+                    chunk = GenerationChunk(text=part["response"])
+                    if run_manager is not None:
+                        run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                    yield chunk
+
+    return GatewayOllama(model=model, timeout=timeout)
+
+# LLM for the "GPT-4o" / "LLAMA3" model selectboxes; timeout as for get_chat_openai
+def get_llm(model_choice, timeout=None):
+    return get_chat_openai(timeout=timeout) if model_choice == "GPT-4o" else get_ollama("llama3", timeout)
@@ -0,0 +1,320 @@
+import os
+import json
+import time
+import random
+import asyncio
+import threading
+import contextvars
+from collections import OrderedDict, defaultdict, deque
+from contextlib import contextmanager
+from functools import lru_cache
+
+# Process-wide admission control for OpenAI requests: request-per-minute and token-per-minute buckets,
+# round-robin between users, interactive chat ahead of bulk report/FAQ/memo questions, and retries with
+# jittered backoff when the API still answers 429 or 5xx.
+
+LLM_SCHEDULER = os.getenv("OA_LLM_SCHEDULER", "1") == "1"
+OPENAI_RPM = int(os.getenv("OA_OPENAI_RPM", "500"))
+OPENAI_TPM = int(os.getenv("OA_OPENAI_TPM", "30000"))
+LLM_MAX_RETRIES = int(os.getenv("OA_LLM_MAX_RETRIES", "5"))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("OA_LLM_BACKOFF_BASE_SECONDS", "1"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("OA_LLM_BACKOFF_MAX_SECONDS", "60"))
+# Completion tokens counted for a request without max_tokens
+LLM_DEFAULT_COMPLETION_TOKENS = int(os.getenv("OA_LLM_DEFAULT_COMPLETION_TOKENS", "1000"))
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_BULK: "bulk"}
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_user = contextvars.ContextVar("llm_user", default="anonymous")
+_priority = contextvars.ContextVar("llm_priority", default=PRIORITY_BULK)
+_deadline = contextvars.ContextVar("llm_deadline", default=None)  # time.monotonic() value
+
+# LLM requests made inside the block are queued for this user and/or priority. With a deadline they give
+# up waiting in the queue, are not retried and do not wait on the network past it.
+@contextmanager
+def request_context(user=None, priority=None, deadline=None):
+    tokens = []
+    if user is not None:
+        tokens.append((_user, _user.set(user)))
+    if priority is not None:
+        tokens.append((_priority, _priority.set(priority)))
+    if deadline is not None:
+        tokens.append((_deadline, _deadline.set(deadline)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+# Whether waiting delay more seconds would run past the deadline of the current request context
+def past_deadline(delay=0.0, deadline=None):
+    deadline = deadline if deadline is not None else _deadline.get()
+    return deadline is not None and time.monotonic() + delay >= deadline
+
+# fn bound to the caller's user and priority, for work handed to a thread pool (threads do not inherit them)
+def with_request_context(fn):
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.copy().run(fn, *args, **kwargs)
+
+class TokenBucket:
+    """Refills continuously at per_minute / 60 per second up to per_minute."""
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    # Seconds until amount can be taken (a request larger than the bucket waits for a full bucket)
+    def wait_time(self, amount, now):
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def take(self, amount, now):
+        self._refill(now)
+        self.tokens -= min(amount, self.capacity)
+
+class FairScheduler:
+    """Grants one request at a time from per-priority, per-user FIFO queues. The highest priority with
+    waiting requests goes first; within it users take turns, so one analyst's 40 report questions
+    cannot starve another's single FAQ."""
+
+    def __init__(self, rpm=OPENAI_RPM, tpm=OPENAI_TPM, window=1000):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.blocked_until = 0.0  # set from the Retry-After of a 429
+        self._cond = threading.Condition()
+        self._queues = {priority: OrderedDict() for priority in PRIORITY_NAMES}  # priority -> user -> deque of tickets
+        self._waits = defaultdict(lambda: deque(maxlen=window))  # priority -> seconds waited
+        self._granted = defaultdict(int)
+        self._throttled = 0
+        self._retries = 0
+        self._timed_out = 0
+
+    def _head(self):
+        for priority in sorted(self._queues):
+            users = self._queues[priority]
+            if users:
+                return next(iter(users.values()))[0]
+        return None
+
+    # Block until the request may be sent; tokens is its estimated prompt + completion size. Raises
+    # TimeoutError, and leaves the queue, if deadline (a time.monotonic() value) passes first.
+    def acquire(self, user, priority, tokens, deadline=None):
+        ticket = object()
+        start_time = time.monotonic()
+        with self._cond:
+            self._queues[priority].setdefault(user, deque()).append(ticket)
+            self._cond.notify_all()
+            while True:
+                now = time.monotonic()
+                if deadline is not None and now >= deadline:
+                    self._leave(priority, user, ticket)
+                    raise TimeoutError(f"Waited {now - start_time:.1f}s for the LLM scheduler past the request deadline")
+                remaining = None if deadline is None else deadline - now
+                if self._head() is not ticket:
+                    self._cond.wait(remaining)
+                    continue
+                wait = max(self.blocked_until - now, self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+                if wait > 0:
+                    self._cond.wait(wait if remaining is None else min(wait, remaining))
+                    continue
+                self.requests.take(1, now)
+                self.tokens.take(tokens, now)
+                queue = self._queues[priority].pop(user)
+                queue.popleft()
+                if queue:
+                    # The user goes to the back of the round-robin
+                    self._queues[priority][user] = queue
+                self._waits[priority].append(now - start_time)
+                self._granted[priority] += 1
+                self._cond.notify_all()
+                return now - start_time
+
+    def _leave(self, priority, user, ticket):
+        queue = self._queues[priority][user]
+        queue.remove(ticket)
+        if not queue:
+            del self._queues[priority][user]
+        self._timed_out += 1
+        self._cond.notify_all()
+
+    # The API answered 429: hold every queued request for delay seconds
+    def throttle(self, delay):
+        with self._cond:
+            self._throttled += 1
+            self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+
+    def record_retry(self):
+        with self._cond:
+            self._retries += 1
+
+    def stats(self):
+        with self._cond:
+            stats = {"throttled": self._throttled, "retries": self._retries, "timed_out": self._timed_out, "priorities": {}}
+            for priority, name in PRIORITY_NAMES.items():
+                waits = sorted(self._waits[priority])
+                stats["priorities"][name] = {
+                    "queue_depth": sum(len(queue) for queue in self._queues[priority].values()),
+                    "waiting_users": len(self._queues[priority]),
+                    "granted": self._granted[priority],
+                    "avg_wait_ms": sum(waits) / len(waits) * 1000 if waits else 0.0,
+                    "p95_wait_ms": waits[int(0.95 * (len(waits) - 1))] * 1000 if waits else 0.0,
+                }
+            return stats
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler():
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = FairScheduler()
+        return _scheduler
+
+def scheduler_stats():
+    return get_scheduler().stats()
+
+# Tokens OpenAI counts against the TPM limit for a request: the prompt (about 4 characters per token)
+# plus max_tokens. An embeddings request counts its input, as text or as lists of token ids, and
+# generates nothing.
+def estimate_request_tokens(body):
+    try:
+        payload = json.loads(body or b"{}")
+    except ValueError:
+        return LLM_DEFAULT_COMPLETION_TOKENS
+    if "input" in payload:
+        inputs = payload["input"]
+        inputs = [inputs] if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)) else inputs
+        return max(1, sum(len(item) // 4 if isinstance(item, str) else len(item) for item in inputs))
+    characters = 0
+    for message in payload.get("messages", []):
+        content = message.get("content")
+        characters += len(content if isinstance(content, str) else json.dumps(content))
+    characters += len(str(payload.get("prompt", "")))
+    return characters // 4 + (payload.get("max_tokens") or LLM_DEFAULT_COMPLETION_TOKENS)
+
+# Seconds to wait before retrying: the server's retry-after when it sent one, plus full jitter so
+# that requests throttled together do not come back together
+def retry_delay(attempt, headers=None):
+    headers = headers or {}
+    backoff = random.uniform(0, min(LLM_BACKOFF_MAX_SECONDS, LLM_BACKOFF_BASE_SECONDS * 2 ** attempt))
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000 + backoff
+        if "retry-after" in headers:
+            return float(headers["retry-after"]) + backoff
+    except ValueError:
+        pass
+    return backoff
+
+def _retryable_errors():
+    import httpx
+    return (httpx.ConnectError, httpx.RemoteProtocolError)
+
+# Shorten the request's connect/read/write/pool timeouts to the time left before its deadline
+def _cap_timeouts(request, deadline):
+    if deadline is None:
+        return
+    remaining = max(0.001, deadline - time.monotonic())
+    timeouts = request.extensions.get("timeout", {})
+    request.extensions["timeout"] = {name: remaining if value is None else min(value, remaining) for name, value in timeouts.items()}
+
+@lru_cache(maxsize=None)
+def _scheduled_transport_classes():
+    import httpx
+
+    class ScheduledTransport(httpx.BaseTransport):
+        """Sends each request through the scheduler and retries 429/5xx and dropped connections."""
+
+        def __init__(self, transport, scheduler):
+            self.transport = transport
+            self.scheduler = scheduler
+
+        def handle_request(self, request):
+            tokens = estimate_request_tokens(request.read())
+            user, priority, deadline = _user.get(), _priority.get(), _deadline.get()
+            for attempt in range(LLM_MAX_RETRIES + 1):
+                try:
+                    self.scheduler.acquire(user, priority, tokens, deadline)
+                except TimeoutError as e:
+                    raise httpx.PoolTimeout(str(e), request=request)
+                _cap_timeouts(request, deadline)
+                try:
+                    response = self.transport.handle_request(request)
+                except _retryable_errors():
+                    delay = retry_delay(attempt)
+                    if attempt == LLM_MAX_RETRIES or past_deadline(delay, deadline):
+                        raise
+                else:
+                    if response.status_code not in RETRY_STATUSES or attempt == LLM_MAX_RETRIES:
+                        return response
+                    delay = retry_delay(attempt, response.headers)
+                    if past_deadline(delay, deadline):
+                        return response
+                    response.close()
+                    if response.status_code == 429:
+                        self.scheduler.throttle(delay)
+                self.scheduler.record_retry()
+                time.sleep(delay)
+
+        def close(self):
+            self.transport.close()
+
+    class AsyncScheduledTransport(httpx.AsyncBaseTransport):
+        def __init__(self, transport, scheduler):
+            self.transport = transport
+            self.scheduler = scheduler
+
+        async def handle_async_request(self, request):
+            tokens = estimate_request_tokens(await request.aread())
+            user, priority, deadline = _user.get(), _priority.get(), _deadline.get()
+            for attempt in range(LLM_MAX_RETRIES + 1):
+                # The scheduler blocks on a condition variable, so wait for it off the event loop
+                try:
+                    await asyncio.to_thread(self.scheduler.acquire, user, priority, tokens, deadline)
+                except TimeoutError as e:
+                    raise httpx.PoolTimeout(str(e), request=request)
+                _cap_timeouts(request, deadline)
+                try:
+                    response = await self.transport.handle_async_request(request)
+                except _retryable_errors():
+                    delay = retry_delay(attempt)
+                    if attempt == LLM_MAX_RETRIES or past_deadline(delay, deadline):
+                        raise
+                else:
+                    if response.status_code not in RETRY_STATUSES or attempt == LLM_MAX_RETRIES:
+                        return response
+                    delay = retry_delay(attempt, response.headers)
+                    if past_deadline(delay, deadline):
+                        return response
+                    await response.aclose()
+                    if response.status_code == 429:
+                        self.scheduler.throttle(delay)
+                self.scheduler.record_retry()
+                await asyncio.sleep(delay)
+
+        async def aclose(self):
+            await self.transport.aclose()
+
+    return ScheduledTransport, AsyncScheduledTransport
+
+# Wrap an httpx transport so its requests go through the process-wide scheduler (unless OA_LLM_SCHEDULER=0)
+def scheduled_transport(transport):
+    if not LLM_SCHEDULER:
+        return transport
+    return _scheduled_transport_classes()[0](transport, get_scheduler())
+
+def async_scheduled_transport(transport):
+    if not LLM_SCHEDULER:
+        return transport
+    return _scheduled_transport_classes()[1](transport, get_scheduler())
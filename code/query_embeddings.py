@@ -0,0 +1,132 @@
+import os
+import json
+import sqlite3
+import hashlib
+import threading
+from array import array
+
+QUERY_EMBEDDINGS_PATH = os.getenv("OA_QUERY_EMBEDDINGS_PATH", "constant/query_embeddings.sqlite")
+
+# Every report question in constant.json, in section order
+def constant_questions(data):
+    questions = []
+    for section in data["data"]:
+        for question in section["questions"]:
+            if isinstance(question, dict):
+                questions += list(question.values())
+            elif isinstance(question, str):
+                questions.append(question)
+    return questions
+
+def faq_questions(data):
+    return [faq.get("question", "No question provided") for faq in data["questions"]]
+
+# Static question files whose embeddings are precomputed, with the function that lists their questions
+STATIC_QUESTION_SOURCES = {
+    "constant/constant.json": constant_questions,
+    "constant/faqs.json": faq_questions,
+}
+
+def query_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+# Name of the embedding model, so vectors of different models never mix
+def embedding_model_name(embeddings):
+    return getattr(embeddings, "model_name", None) or getattr(embeddings, "model", None) or type(embeddings).__name__
+
+class QueryEmbeddingStore:
+    """Persistent query text -> embedding store keyed by text hash and embedding model."""
+
+    def __init__(self, path=QUERY_EMBEDDINGS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS queries (model TEXT NOT NULL, text_hash TEXT NOT NULL, vector BLOB NOT NULL, "
+            "PRIMARY KEY (model, text_hash))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sources (path TEXT NOT NULL, model TEXT NOT NULL, content_hash TEXT NOT NULL, "
+            "PRIMARY KEY (path, model))"
+        )
+        self._conn.commit()
+
+    def get_all(self, model):
+        with self._lock:
+            rows = self._conn.execute("SELECT text_hash, vector FROM queries WHERE model = ?", (model,)).fetchall()
+        return {text_hash: array("d", blob).tolist() for text_hash, blob in rows}
+
+    def source_hashes(self, model):
+        with self._lock:
+            rows = self._conn.execute("SELECT path, content_hash FROM sources WHERE model = ?", (model,)).fetchall()
+        return dict(rows)
+
+    # Replace the model's vectors and source hashes with a freshly built set
+    def replace(self, model, vectors, source_hashes):
+        with self._lock:
+            self._conn.execute("DELETE FROM queries WHERE model = ?", (model,))
+            self._conn.executemany(
+                "INSERT INTO queries (model, text_hash, vector) VALUES (?, ?, ?)",
+                [(model, text_hash, array("d", vector).tobytes()) for text_hash, vector in vectors.items()]
+            )
+            self._conn.execute("DELETE FROM sources WHERE model = ?", (model,))
+            self._conn.executemany(
+                "INSERT INTO sources (path, model, content_hash) VALUES (?, ?, ?)",
+                [(path, model, content_hash) for path, content_hash in source_hashes.items()]
+            )
+            self._conn.commit()
+
+_query_embedding_store = None
+_query_embedding_lock = threading.Lock()
+_loaded = {}  # model -> (source_hashes, {text_hash: vector})
+
+def get_query_embedding_store():
+    global _query_embedding_store
+    if _query_embedding_store is None:
+        _query_embedding_store = QueryEmbeddingStore()
+    return _query_embedding_store
+
+# Content hash and questions of every static question file that exists
+def read_static_sources(sources=STATIC_QUESTION_SOURCES):
+    hashes = {}
+    questions = {}
+    for path, list_questions in sources.items():
+        if not os.path.exists(path):
+            continue
+        with open(path, "rb") as f:
+            content = f.read()
+        hashes[path] = hashlib.sha256(content).hexdigest()
+        questions[path] = list_questions(json.loads(content))
+    return hashes, questions
+
+# {text_hash: vector} for every static question. Vectors come from memory, then from the store; the
+# embeddings API is only called for questions that are new since a question file last changed.
+def static_query_vectors(embeddings, sources=STATIC_QUESTION_SOURCES):
+    model = embedding_model_name(embeddings)
+    hashes, questions = read_static_sources(sources)
+    with _query_embedding_lock:
+        if model in _loaded and _loaded[model][0] == hashes:
+            return _loaded[model][1]
+
+        store = get_query_embedding_store()
+        vectors = store.get_all(model)
+        if store.source_hashes(model) != hashes:
+            texts = {query_hash(text): text for path in questions for text in questions[path]}
+            missing = {text_hash: text for text_hash, text in texts.items() if text_hash not in vectors}
+            if missing:
+                model_embeddings = getattr(embeddings, "underlying", embeddings)
+                vectors.update(zip(missing.keys(), model_embeddings.embed_documents(list(missing.values()))))
+            # Drop questions that were removed from the files
+            vectors = {text_hash: vectors[text_hash] for text_hash in texts}
+            store.replace(model, vectors, hashes)
+
+        _loaded[model] = (hashes, vectors)
+        return vectors
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    from resources import get_text_embeddings
+    vectors = static_query_vectors(get_text_embeddings())
+    print(f"{len(vectors)} static question embeddings ready in {QUERY_EMBEDDINGS_PATH}")
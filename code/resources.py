@@ -0,0 +1,18 @@
+from functools import lru_cache
+
+# Heavy objects shared by every page. Each getter imports its dependency on first use
+# and returns the same instance for the lifetime of the process, so Streamlit reruns reuse them.
+
+@lru_cache(maxsize=None)
+def get_text_embeddings():
+    from llm_gateway import get_openai_embeddings
+    from embedding_cache import CachedEmbeddings
+    return CachedEmbeddings(get_openai_embeddings())
+
+# LLM clients and LangChain models live in llm_gateway, which pools their HTTP connections
+
+@lru_cache(maxsize=None)
+def register_arabic_font():
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    pdfmetrics.registerFont(TTFont('ArabicFont', "assets/ArabicFont/NotoKufiArabic-Regular.ttf"))
@@ -0,0 +1,111 @@
+import os
+from contextlib import nullcontext
+import numpy as np
+from query_embeddings import static_query_vectors, query_hash
+
+# "hybrid" (dense + BM25), "dense" or "bm25". Vectorstores without an on-disk BM25 index (see
+# index_manager.attach_bm25_index) are always searched dense.
+RETRIEVAL_MODE = os.getenv("OA_RETRIEVAL_MODE", "hybrid")
+# Candidates taken from each retriever before fusion, and the reciprocal rank fusion constant
+HYBRID_FETCH_K = int(os.getenv("OA_HYBRID_FETCH_K", "20"))
+HYBRID_RRF_K = int(os.getenv("OA_HYBRID_RRF_K", "60"))
+
+# Embedding model attached to a langchain FAISS vectorstore
+def vectorstore_embeddings(vectorstore):
+    embedding_function = getattr(vectorstore, "embedding_function", None)
+    if hasattr(embedding_function, "embed_documents"):
+        return embedding_function
+    return vectorstore.embeddings
+
+# Embed every query in one embeddings request. Questions from the static question files are
+# served from the precomputed query embedding store and never reach the API. Ad-hoc queries go to the
+# model directly, not through CachedEmbeddings, so they do not pile up in the chunk embedding cache.
+def embed_queries(queries, embeddings):
+    queries = list(queries)
+    if not queries:
+        return np.zeros((0, 0), dtype=np.float32)
+    try:
+        precomputed = static_query_vectors(embeddings)
+    except Exception as e:
+        print(f"Precomputed query embeddings unavailable: {e}")
+        precomputed = {}
+
+    vectors = [precomputed.get(query_hash(query)) for query in queries]
+    missing = [query for query, vector in zip(queries, vectors) if vector is None]
+    if missing:
+        model_embeddings = getattr(embeddings, "underlying", embeddings)
+        embedded = iter(model_embeddings.embed_documents(missing))
+        vectors = [vector if vector is not None else next(embedded) for vector in vectors]
+    return np.asarray(vectors, dtype=np.float32)
+
+# Application lock of a vectorstore loaded through index_manager (see vectorstore_cache.application_lock)
+def _locked(vectorstore):
+    return getattr(vectorstore, "lock", None) or nullcontext()
+
+# Top-k docstore ids for each query vector from a single matrix search against the FAISS index.
+# Chunks of replaced documents still inside the loaded base (deleted_ids) are fetched past and skipped.
+def search_ids_by_vectors(vectorstore, vectors, k=3):
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    if getattr(vectorstore, "_normalize_L2", False) and len(vectors):
+        import faiss
+        faiss.normalize_L2(vectors)
+    with _locked(vectorstore):
+        if len(vectors) == 0 or vectorstore.index.ntotal == 0:
+            return [[] for _ in range(len(vectors))]
+        deleted = getattr(vectorstore, "deleted_ids", None) or set()
+        _, indices = vectorstore.index.search(vectors, min(k + len(deleted), vectorstore.index.ntotal))
+        ids = [[vectorstore.index_to_docstore_id[i] for i in row if i != -1] for row in indices]
+    return [[chunk_id for chunk_id in row if chunk_id not in deleted][:k] for row in ids]
+
+def lookup_documents(vectorstore, chunk_ids):
+    docs = []
+    with _locked(vectorstore):
+        for chunk_id in chunk_ids:
+            doc = vectorstore.docstore.search(chunk_id)
+            if not isinstance(doc, str):  # The docstore returns an error message for unknown ids
+                docs.append(doc)
+    return docs
+
+# Top-k documents for each query vector
+def search_by_vectors(vectorstore, vectors, k=3):
+    with _locked(vectorstore):
+        return [lookup_documents(vectorstore, ids) for ids in search_ids_by_vectors(vectorstore, vectors, k)]
+
+# Reciprocal rank fusion of several ranked id lists; ids ranked high in either list come first
+def fuse_rankings(rankings, k=3, rrf_k=HYBRID_RRF_K):
+    scores = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (rrf_k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)[:k]
+
+# Batched replacement for calling vectorstore.similarity_search once per question:
+# one embeddings call for all questions, one FAISS search, a list of top-k documents per question.
+# In "hybrid" mode the dense candidates are fused with the BM25 keyword candidates, so exact
+# identifiers (queue names, CR numbers, T24, IBPS) are found even when the embedding misses them.
+# Ids are searched and looked up under one hold of the application lock, so a concurrent write cannot
+# remove a hit in between.
+def similarity_search_batch(vectorstore, queries, k=3, embeddings=None, mode=None):
+    queries = list(queries)
+    index = getattr(vectorstore, "bm25_index", None)
+    mode = (mode or RETRIEVAL_MODE) if index is not None else "dense"
+    if mode == "bm25":
+        with _locked(vectorstore):
+            return [lookup_documents(vectorstore, [chunk_id for chunk_id, _ in index.search(query, k)]) for query in queries]
+
+    vectors = embed_queries(queries, embeddings or vectorstore_embeddings(vectorstore))
+    if mode != "hybrid":
+        return search_by_vectors(vectorstore, vectors, k)
+
+    fetch_k = max(k, HYBRID_FETCH_K)
+    results = []
+    with _locked(vectorstore):
+        for query, dense_ids in zip(queries, search_ids_by_vectors(vectorstore, vectors, fetch_k)):
+            keyword_ids = [chunk_id for chunk_id, _ in index.search(query, fetch_k)]
+            results.append(lookup_documents(vectorstore, fuse_rankings([dense_ids, keyword_ids], k)))
+    return results
+
+# {question: top-k documents} for a set of questions
+def retrieve_for_questions(vectorstore, questions, k=3, embeddings=None, mode=None):
+    questions = list(dict.fromkeys(questions))
+    return dict(zip(questions, similarity_search_batch(vectorstore, questions, k, embeddings, mode)))
@@ -0,0 +1,95 @@
+import os
+import re
+import json
+import sqlite3
+import threading
+import time
+
+TRANSLATION_MEMORY_PATH = os.getenv("OA_TRANSLATION_MEMORY_PATH", "constant/translation_memory.sqlite")
+TEMPLATE_PATHS = ["constant/template.json", "constant/templatenew.json"]
+
+# Whitespace-insensitive form of the source text used as the lookup key
+def normalize_source(text):
+    return re.sub(r"\s+", " ", str(text)).strip()
+
+class TranslationMemory:
+    """Persistent source text -> translation store keyed by normalized text and model."""
+
+    def __init__(self, path=TRANSLATION_MEMORY_PATH):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS translations ("
+            "source TEXT NOT NULL, model TEXT NOT NULL, translation TEXT NOT NULL, created REAL NOT NULL, "
+            "PRIMARY KEY (source, model))"
+        )
+        self._conn.commit()
+
+    def get(self, text, model):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT translation FROM translations WHERE source = ? AND model = ?", (normalize_source(text), model)
+            ).fetchone()
+            if row:
+                self.hits += 1
+                return row[0]
+            self.misses += 1
+            return None
+
+    def put(self, text, model, translation):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO translations (source, model, translation, created) VALUES (?, ?, ?, ?)",
+                (normalize_source(text), model, translation, time.time())
+            )
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": entries,
+        }
+
+_translation_memory = None
+_translation_memory_lock = threading.Lock()
+
+def get_translation_memory():
+    global _translation_memory
+    with _translation_memory_lock:
+        if _translation_memory is None:
+            _translation_memory = TranslationMemory()
+        return _translation_memory
+
+# Every section and subsection title in the memo templates
+def template_titles(template_paths=TEMPLATE_PATHS):
+    titles = []
+    for template_path in template_paths:
+        if not os.path.exists(template_path):
+            continue
+        with open(template_path, "r") as f:
+            template = json.load(f)
+        for section in template["template"]["sections"]:
+            for entry in [section] + section.get("subsections", []):
+                if entry.get("title") and entry["title"] not in titles:
+                    titles.append(entry["title"])
+    return titles
+
+# Translate all template titles ahead of time so memos only pay for their new content
+def warm_up_from_templates(template_paths=TEMPLATE_PATHS):
+    from arabic_translation import translate_many
+    titles = template_titles(template_paths)
+    translate_many({title: title for title in titles})
+    return len(titles)
+
+if __name__ == "__main__":
+    count = warm_up_from_templates()
+    print(f"Warmed up {count} template titles: {get_translation_memory().stats()}")
@@ -1,7 +1,8 @@
 import streamlit as st
 from PIL import Image
 import os
-from doc_generator_page import load_embeddings, text_embeddings
+from resources import get_text_embeddings
+from index_manager import load_embeddings
 import json
 import datetime
 
@@ -14,8 +15,9 @@ def authenticate_user(application_id):
         return False
 
 # Function to check if embeddings exist for the given application ID
+# (load_embeddings returns the process-wide cached index instead of unpickling it again)
 def check_embeddings(application_id, text_embeddings):
-    embeddings_file = f"{application_id}_embeddings.pkl"
+    embeddings_file = f"embeddings/{application_id}_embeddings.pkl"
     if os.path.exists(embeddings_file):
         return load_embeddings(application_id, text_embeddings)
     else:
@@ -28,6 +30,7 @@ def main():
     # Display image using Streamlit
     st.image(image, caption='', width=225)
     st.header("User Authentication 🔐")
+    text_embeddings = get_text_embeddings()
 
     #Opening database json file
     with open("constant\\database.json", "r") as f:
@@ -0,0 +1,93 @@
+import os
+import threading
+from collections import OrderedDict
+from index_factory import index_memory_bytes
+
+VECTORSTORE_CACHE_MAX_MB = float(os.getenv("OA_VECTORSTORE_CACHE_MAX_MB", "1024"))
+
+_lock = threading.Lock()
+_cache = OrderedDict()  # application_id -> (index_mtime, vectorstore, size_bytes)
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+# Latest modification time of the files that make up an application's index
+def index_mtime(application_id):
+    embeddings_file = f"embeddings/{application_id}_embeddings.pkl"
+    mtimes = []
+    for root, _, files in os.walk(embeddings_file):
+        for name in files:
+            try:
+                mtimes.append(os.path.getmtime(os.path.join(root, name)))
+            except FileNotFoundError:
+                pass  # An SQLite journal that was removed while walking
+    return max(mtimes) if mtimes else None
+
+# Rough resident size of a FAISS vectorstore: the index (flat, HNSW or IVF-PQ) plus chunk texts
+def estimate_size(vectorstore):
+    index = getattr(vectorstore, "index", None)
+    size = index_memory_bytes(index) if index is not None else 0
+    # Texts in an SQLite docstore stay on disk; only the chunks added since it was written are in memory
+    docstore = getattr(vectorstore, "docstore", None)
+    docs = getattr(docstore, "_dict", None)
+    if docs is None:
+        docs = getattr(docstore, "pending", {})
+    size += sum(len(doc.page_content) for doc in list(docs.values()))
+    return size
+
+def _evict_over_budget():
+    budget = VECTORSTORE_CACHE_MAX_MB * 1024 * 1024
+    while len(_cache) > 1 and sum(entry[2] for entry in _cache.values()) > budget:
+        _cache.popitem(last=False)
+        _stats["evictions"] += 1
+
+# Return the shared vectorstore for an application, calling loader() only when it is missing or stale
+def get_vectorstore(application_id, loader):
+    mtime = index_mtime(application_id)
+    with _lock:
+        entry = _cache.get(application_id)
+        if entry is not None and entry[0] == mtime:
+            _cache.move_to_end(application_id)
+            _stats["hits"] += 1
+            return entry[1]
+        _stats["misses"] += 1
+
+    vectorstore = loader()
+    if vectorstore is not None:
+        put_vectorstore(application_id, vectorstore, mtime)
+    return vectorstore
+
+# Record an updated vectorstore after its files were written, so other sessions see it without reloading
+def put_vectorstore(application_id, vectorstore, mtime=None):
+    if mtime is None:
+        mtime = index_mtime(application_id)
+    with _lock:
+        _cache[application_id] = (mtime, vectorstore, estimate_size(vectorstore))
+        _cache.move_to_end(application_id)
+        _evict_over_budget()
+
+_app_locks = {}
+
+# Lock around in-place changes to an application's vectorstore, which every session shares through this
+# cache. Searches hold it too, so they never see a half-swapped index or a closed docstore.
+def application_lock(application_id):
+    with _lock:
+        return _app_locks.setdefault(application_id, threading.RLock())
+
+_manifest_locks = {}
+
+# Lock held from reading an application's manifest until the changed one is saved (uploads, compaction,
+# folding segments on load). Kept apart from application_lock so searches run while a document is embedded.
+def manifest_lock(application_id):
+    with _lock:
+        return _manifest_locks.setdefault(application_id, threading.RLock())
+
+def invalidate(application_id):
+    with _lock:
+        _cache.pop(application_id, None)
+
+def cache_stats():
+    with _lock:
+        return {
+            **_stats,
+            "entries": len(_cache),
+            "size_mb": sum(entry[2] for entry in _cache.values()) / (1024 * 1024),
+        }
@@ -0,0 +1,62 @@
+import random
+
+import pytest
+
+from diff_engine import myers_opcodes, patience_opcodes, difflib_opcodes
+
+
+def lcs_length(a, b):
+    row = [0] * (len(b) + 1)
+    for x in a:
+        previous = 0
+        for j, y in enumerate(b, start=1):
+            previous, row[j] = row[j], previous + 1 if x == y else max(row[j], row[j - 1])
+    return row[-1]
+
+
+def check_opcodes(opcodes, a, b):
+    # Opcodes cover both sequences left to right without gaps, and "equal" ranges really are equal
+    i = j = 0
+    matched = 0
+    for tag, i1, i2, j1, j2 in opcodes:
+        assert (i1, j1) == (i, j)
+        assert i1 <= i2 <= len(a) and j1 <= j2 <= len(b)
+        if tag == "equal":
+            assert a[i1:i2] == b[j1:j2]
+            matched += i2 - i1
+        elif tag == "delete":
+            assert i2 > i1 and j2 == j1
+        elif tag == "insert":
+            assert j2 > j1 and i2 == i1
+        else:
+            assert tag == "replace" and i2 > i1 and j2 > j1
+        i, j = i2, j2
+    assert (i, j) == (len(a), len(b))
+    return matched
+
+
+def random_cases(count=300, seed=1234):
+    rng = random.Random(seed)
+    for _ in range(count):
+        alphabet = [f"line {n}\n" for n in range(rng.randint(1, 6))]
+        a = [rng.choice(alphabet) for _ in range(rng.randint(0, 40))]
+        b = [rng.choice(alphabet) for _ in range(rng.randint(0, 40))]
+        yield a, b
+
+
+def test_myers_matches_the_longest_common_subsequence():
+    for a, b in random_cases():
+        assert check_opcodes(myers_opcodes(a, b), a, b) == lcs_length(a, b)
+
+
+@pytest.mark.parametrize("engine", [patience_opcodes, difflib_opcodes])
+def test_other_engines_produce_valid_opcodes(engine):
+    for a, b in random_cases():
+        assert check_opcodes(engine(a, b), a, b) <= lcs_length(a, b)
+
+
+def test_edited_document():
+    a = [f"clause {n}\n" for n in range(200)]
+    b = a[:50] + ["new clause\n"] + a[50:120] + a[130:]
+    assert check_opcodes(myers_opcodes(a, b), a, b) == 190
+    assert check_opcodes(patience_opcodes(a, b), a, b) == 190
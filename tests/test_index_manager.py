@@ -0,0 +1,124 @@
+import hashlib
+import os
+
+import numpy as np
+import pytest
+from langchain.embeddings.base import Embeddings
+
+import index_manager
+import vectorstore_cache
+from retrieval import retrieve_for_questions
+
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic random vectors per text, so a chunk's own text is always its nearest neighbour.
+    fail_after makes embed_documents raise once that many batches have been embedded."""
+
+    def __init__(self, fail_after=None):
+        self.fail_after = fail_after
+        self.batches = 0
+
+    def _vector(self, text):
+        rng = np.random.default_rng(int(hashlib.md5(text.encode()).hexdigest()[:8], 16))
+        return rng.standard_normal(32).astype("float32").tolist()
+
+    def embed_documents(self, texts):
+        if self.fail_after is not None and self.batches >= self.fail_after:
+            raise RuntimeError("embedding service unavailable")
+        self.batches += 1
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+
+@pytest.fixture(autouse=True)
+def in_tmp_path(tmp_path, monkeypatch):
+    # Indexes are stored under embeddings/ relative to the working directory
+    monkeypatch.chdir(tmp_path)
+    vectorstore_cache.invalidate("app")
+    yield
+    vectorstore_cache.invalidate("app")
+
+
+def chunks(doc, version, count=10):
+    return [f"{doc} {version} chunk {i}" for i in range(count)]
+
+
+def doc_hash(doc, version):
+    return hashlib.sha256(f"{doc} {version}".encode()).hexdigest()
+
+
+def index(vectorstore, doc, version, embeddings=None, count=10):
+    return index_manager.index_document("app", vectorstore, doc, doc_hash(doc, version), chunks(doc, version, count),
+                                        embeddings or FakeEmbeddings())
+
+
+def top_hit(vectorstore, question):
+    return retrieve_for_questions(vectorstore, [question], k=1)[question][0].page_content
+
+
+def live_texts(vectorstore):
+    deleted = getattr(vectorstore, "deleted_ids", set())
+    return sorted(vectorstore.docstore.search(chunk_id).page_content
+                  for chunk_id in vectorstore.index_to_docstore_id.values() if chunk_id not in deleted)
+
+
+def test_add_skip_and_reload():
+    vectorstore, status = index(None, "a", "v1")
+    assert status == "added"
+    vectorstore, status = index(vectorstore, "b", "v1")
+    assert status == "added"
+    _, status = index(vectorstore, "a", "v1")
+    assert status == "skipped"
+
+    reloaded = index_manager.load_index("app", FakeEmbeddings())
+    assert live_texts(reloaded) == sorted(chunks("a", "v1") + chunks("b", "v1"))
+    assert top_hit(reloaded, "b v1 chunk 3") == "b v1 chunk 3"
+
+
+def test_replace_keeps_only_the_new_version():
+    vectorstore, _ = index(None, "a", "v1")
+    vectorstore, _ = index(vectorstore, "b", "v1")
+    vectorstore, status = index(vectorstore, "a", "v2", count=6)
+    assert status == "replaced"
+    expected = sorted(chunks("a", "v2", 6) + chunks("b", "v1"))
+    assert live_texts(vectorstore) == expected
+
+    reloaded = index_manager.load_index("app", FakeEmbeddings())
+    assert live_texts(reloaded) == expected
+    assert top_hit(reloaded, "a v1 chunk 8") != "a v1 chunk 8"
+    assert index_manager.load_manifest("app")["documents"]["a"]["hash"] == doc_hash("a", "v2")
+
+
+def test_replace_after_reload_from_the_base():
+    vectorstore, _ = index(None, "a", "v1")
+    index(vectorstore, "b", "v1")
+    # Loading folds the segments into a base; the next replace has to mask the old chunks inside it
+    reloaded = index_manager.load_index("app", FakeEmbeddings())
+    reloaded, status = index(reloaded, "a", "v2")
+    assert status == "replaced"
+    expected = sorted(chunks("a", "v2") + chunks("b", "v1"))
+    assert live_texts(reloaded) == expected
+    assert live_texts(index_manager.load_index("app", FakeEmbeddings())) == expected
+
+
+def test_failed_replace_keeps_the_old_version():
+    vectorstore, _ = index(None, "a", "v1")
+    vectorstore, _ = index(vectorstore, "b", "v1")
+    batches = [(chunks("a", "v2")[:5], [{}] * 5), (chunks("a", "v2")[5:], [{}] * 5)]
+    with pytest.raises(RuntimeError):
+        index_manager.index_document_batches("app", vectorstore, "a", doc_hash("a", "v2"), batches,
+                                             FakeEmbeddings(fail_after=1))
+
+    expected = sorted(chunks("a", "v1") + chunks("b", "v1"))
+    assert live_texts(vectorstore) == expected
+    assert index_manager.load_manifest("app")["documents"]["a"]["hash"] == doc_hash("a", "v1")
+    assert not os.path.exists(index_manager.segment_dir("app", doc_hash("a", "v2")))
+    reloaded = index_manager.load_index("app", FakeEmbeddings())
+    assert live_texts(reloaded) == expected
+
+    # The failed upload is not remembered as indexed, so retrying it goes through
+    reloaded, status = index(reloaded, "a", "v2")
+    assert status == "replaced"
+    assert live_texts(reloaded) == sorted(chunks("a", "v2") + chunks("b", "v1"))
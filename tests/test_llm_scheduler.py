@@ -0,0 +1,58 @@
+import threading
+import time
+
+import pytest
+
+from llm_scheduler import FairScheduler, PRIORITY_BULK, PRIORITY_INTERACTIVE
+
+
+def queue_depth(scheduler):
+    return sum(priority["queue_depth"] for priority in scheduler.stats()["priorities"].values())
+
+
+# Queue the requests one at a time, in order, while the scheduler is throttled, then let them through
+# and return the order in which they were granted
+def grant_order(requests):
+    scheduler = FairScheduler(rpm=10000, tpm=10000000)
+    scheduler.throttle(0.3)
+    granted = []
+    threads = []
+    for user, priority in requests:
+        def run(user=user, priority=priority):
+            scheduler.acquire(user, priority, 10)
+            granted.append((user, priority))
+        threads.append(threading.Thread(target=run))
+        threads[-1].start()
+        while queue_depth(scheduler) < len(threads):
+            time.sleep(0.001)
+    for thread in threads:
+        thread.join(5)
+    return granted
+
+
+def test_users_take_turns():
+    order = grant_order([("a", PRIORITY_BULK)] * 3 + [("b", PRIORITY_BULK), ("c", PRIORITY_BULK)])
+    assert [user for user, _ in order] == ["a", "b", "c", "a", "a"]
+
+
+def test_interactive_requests_go_first():
+    order = grant_order([("a", PRIORITY_BULK)] * 2 + [("b", PRIORITY_INTERACTIVE)])
+    assert order == [("b", PRIORITY_INTERACTIVE), ("a", PRIORITY_BULK), ("a", PRIORITY_BULK)]
+
+
+def test_request_rate_is_limited():
+    scheduler = FairScheduler(rpm=60, tpm=10000000)
+    scheduler.requests.tokens = 1
+    scheduler.acquire("a", PRIORITY_BULK, 10)
+    assert scheduler.acquire("a", PRIORITY_BULK, 10) >= 0.9
+
+
+def test_deadline_leaves_the_queue():
+    scheduler = FairScheduler()
+    scheduler.throttle(5)
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        scheduler.acquire("a", PRIORITY_BULK, 10, deadline=start + 0.2)
+    assert time.monotonic() - start < 1
+    assert queue_depth(scheduler) == 0
+    assert scheduler.stats()["timed_out"] == 1